@@ -1,13 +1,10 @@
 from enum import Enum
+from importlib import import_module
+from time import perf_counter
+import logging
 
-from experiments.fieldsweep_4probe import field_sweep_4_probe
-from experiments.fieldsweep_4probe_lockin import field_sweep_4_probe_lockin
-from experiments.iv_yokogawa import iv_yokogawa
-from experiments.iv_keithley import iv_keithley
-from experiments.tempsweep_4probe import temp_sweep_4_probe
-
-from experiments.set_temperature import set_temperature
-from experiments.set_current import set_current
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
 
 class Experiment(Enum):
     FIELD_SWEEP_4_PROBE = "Field Sweep (4 Probe)"
@@ -15,22 +12,80 @@ class Experiment(Enum):
     IV_YOKOGAWA = "IV (Yokogawa)"
     IV_KEITHLEY = "IV (Keithley)"
     TEMPSWEEP_4_PROBE = "Temperature Sweep (4 Probe)"
+    FREQ_SWEEP_LOCKIN = "Frequency Sweep (Lock-in)"
     SET_TEMPERATURE = "Set Temperature"
     SET_CURRENT = "Set Current"
 
     def __str__(self):
         return self.value
-    
-    def choices(): 
+
+    def choices():
         return [experiment.value for experiment in Experiment]
 
 
+# Entry point of each experiment as "module:function". The experiment modules pull in
+# pymeasure, the instrument drivers, etc., so they are only imported once chosen.
 experiments = {
-    Experiment.FIELD_SWEEP_4_PROBE: field_sweep_4_probe,
-    Experiment.FIELD_SWEEP_4_PROBE_LOCKIN: field_sweep_4_probe_lockin,
-    Experiment.IV_YOKOGAWA: iv_yokogawa,
-    Experiment.IV_KEITHLEY: iv_keithley,
-    Experiment.TEMPSWEEP_4_PROBE: temp_sweep_4_probe,
-    Experiment.SET_TEMPERATURE: set_temperature,
-    Experiment.SET_CURRENT: set_current,
+    Experiment.FIELD_SWEEP_4_PROBE: "experiments.fieldsweep_4probe:field_sweep_4_probe",
+    Experiment.FIELD_SWEEP_4_PROBE_LOCKIN: "experiments.fieldsweep_4probe_lockin:field_sweep_4_probe_lockin",
+    Experiment.IV_YOKOGAWA: "experiments.iv_yokogawa:iv_yokogawa",
+    Experiment.IV_KEITHLEY: "experiments.iv_keithley:iv_keithley",
+    Experiment.TEMPSWEEP_4_PROBE: "experiments.tempsweep_4probe:temp_sweep_4_probe",
+    Experiment.FREQ_SWEEP_LOCKIN: "experiments.freqsweep_lockin:freq_sweep_lockin",
+    Experiment.SET_TEMPERATURE: "experiments.set_temperature:set_temperature",
+    Experiment.SET_CURRENT: "experiments.set_current:set_current",
 }
+
+
+def load_experiment(experiment: Experiment):
+    """
+    Imports the module of an experiment and returns its entry function.
+
+    Args:
+        experiment (Experiment): The experiment to load.
+
+    Returns:
+        The entry function, or None if the module could not be imported. A failing
+        experiment does not affect the others.
+    """
+    module_name, function_name = experiments[experiment].split(":")
+    try:
+        module = import_module(module_name)
+    except Exception as e:
+        log.error(f"Failed to import {module_name} for {experiment}: {e}")
+        return None
+
+    return getattr(module, function_name, None)
+
+
+def import_time_report():
+    """
+    Imports every experiment module in turn and reports how long each import took.
+
+    Modules shared between experiments (pymeasure, drivers, ...) are only imported once,
+    so their cost is attributed to the first experiment that needs them.
+
+    Returns:
+        list: (experiment, seconds, error) for every experiment, where error is None on success.
+    """
+    report = []
+    for experiment in Experiment:
+        module_name = experiments[experiment].split(":")[0]
+        start = perf_counter()
+        try:
+            import_module(module_name)
+            error = None
+        except Exception as e:
+            error = e
+        report.append((experiment, perf_counter() - start, error))
+
+    return report
+
+
+def print_import_time_report():
+    report = import_time_report()
+    width = max(len(str(experiment)) for experiment in Experiment)
+    for experiment, seconds, error in report:
+        status = "ok" if error is None else f"FAILED: {error}"
+        print(f"{str(experiment):<{width}}  {seconds * 1e3:9.1f} ms  {status}")
+    print(f"{'Total':<{width}}  {sum(seconds for _, seconds, _ in report) * 1e3:9.1f} ms")
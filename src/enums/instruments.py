@@ -1,9 +1,9 @@
 from enum import Enum
 
 from lakeshore import Model336
-from pymeasure.instruments.keithley.keithley6221 import Keithley6221
 
 from local_instrument.keithley2182 import Keithley2182
+from local_instrument.keithley6221 import Keithley6221
 from local_instrument.Yokogawa_GS200 import YokogawaGS200   
 from local_instrument.Lakeshore_LS625 import ElectromagnetPowerSupply
 from local_instrument.Stanford_SR830 import SR830
@@ -128,7 +128,7 @@ class LocalInstrumentManager(object):
         else:
             return None
 
-    def reset_instruments(self):
+    def reset_instruments(self, keep_field=False):
         if self.connected_instruments.get(LocalInstrument.KEITHLEY_6221):
             self._keithley_6221.reset()
         
@@ -140,7 +140,8 @@ class LocalInstrumentManager(object):
         if self.connected_instruments.get(LocalInstrument.KEITHLEY_2182):
             self._keithley_2182.reset()
 
-        if self.connected_instruments.get(LocalInstrument.LAKESHORE_LS625):
+        if self.connected_instruments.get(LocalInstrument.LAKESHORE_LS625) and not keep_field:
+            # The field is kept when the next run of a campaign starts where this one ended
             self._lakeshore_ls625.set_magnetic_field(0)
         
         if self.connected_instruments.get(LocalInstrument.LAKESHORE_MODEL336):
@@ -150,13 +151,13 @@ class LocalInstrumentManager(object):
         if self.connected_instruments.get(LocalInstrument.STANFORD_SR830):
             self._stanford_sr830.reset()
 
-    def close_instruments(self):
-        self.reset_instruments()
+    def close_instruments(self, keep_field=False, keep_heater=False):
+        self.reset_instruments(keep_field)
 
         if self.connected_instruments.get(LocalInstrument.YOKOGAWA_GS200):
             self._yokogawa_gs200.shutdown()
 
-        if self.connected_instruments.get(LocalInstrument.LAKESHORE_MODEL336):
+        if self.connected_instruments.get(LocalInstrument.LAKESHORE_MODEL336) and not keep_heater:
             self._lakeshore_model336.set_control_setpoint(2, 0)
             self._lakeshore_model336.set_setpoint_ramp_parameter(2, False, 0)
             self._lakeshore_model336.all_heaters_off()
@@ -1,4 +1,5 @@
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 from enum import Enum
 import logging
 import sys
@@ -9,15 +10,26 @@ import numpy as np
 from win11toast import toast
 
 # instrument imports
-from enums.instruments import LocalInstrumentManager, LocalInstrument, ElectromagnetPowerSupply, Keithley2182, YokogawaGS200, Model336
+from enums.instruments import LocalInstrumentManager, LocalInstrument, ElectromagnetPowerSupply, Keithley2182, Keithley6221, YokogawaGS200, Model336
 
 # pymeasure imports for running the experiment
 from pymeasure.experiment import Procedure, Results, unique_filename
-from pymeasure.experiment.parameters import FloatParameter, Parameter, ListParameter
+from pymeasure.experiment.parameters import FloatParameter, IntegerParameter, BooleanParameter, Parameter, ListParameter
 from pymeasure.display.Qt import QtWidgets
 from pymeasure.display.windows import ManagedWindow
-from helpers.helper_functions import SweepType, np_hysteresis
-from helpers.common import HeaterSetting
+from helpers.helper_functions import SweepType
+from helpers.sweep_plan import SweepPlan, AdaptiveStepper
+from helpers.common import HeaterSetting, MeasurementBackend, AcquisitionProfile, CampaignOrder
+from helpers.acquisition import apply_profile, apply_profile_parameters
+from helpers.temperature import configure_heater, wait_for_temperature, magnet_temperature, sample_temperature, MAX_MAGNET_TEMPERATURE
+from helpers.runtime_estimator import CommandLatencies, estimate_field_sweep, format_duration
+from helpers.completion import request_completion, wait_for_completion
+from helpers.magnet import ramp_time, ramp_to_field, abort_ramp, plan_ramp, configure_ramp
+from helpers.nanovoltmeter import VoltageRangeTracker
+from helpers.wait import CancellableWait
+from helpers.checkpoint import SweepCheckpoint, checkpoint_path, resume_path
+from helpers.startup import StartupGraph
+from helpers.campaign import CampaignRun, schedule_campaign
 
 current_directory = os.path.dirname(os.path.abspath(__file__))
 parent_directory = os.path.dirname(current_directory)
@@ -55,92 +67,114 @@ class BSweep4ProbeProcedure(Procedure):
     min_field = FloatParameter("Min Field", units="T", default=-0.1)
     max_field = FloatParameter("Max Field", units="T", default=0.1)
     field_step = FloatParameter("Field Step", units="T", default=10e-3)
+    adaptive_step = BooleanParameter("Adaptive field step", default=False)
+    min_field_step = FloatParameter("Min Field Step", units="T", default=0.5e-3)
+    target_voltage_change = FloatParameter("Target voltage change per step", units="V", default=1e-6)
     time_per_measurement = FloatParameter("Time per measurement", units="s", default=0.1)
     num_plc = FloatParameter("Number of power line cycles aka. measurement accurac (0.1/1/10)", default=5)
     heater_setting = ListParameter("Heater Setting", choices=HeaterSetting.choices(), default=HeaterSetting.LOW)  # Low/Medium/High, to do with Lakeshore 336: refer SOP
     sweep_type = ListParameter("Sweep Type", choices=SweepType.choices(), default=SweepType.B1)
+    measurement_backend = ListParameter("Measurement Backend", choices=MeasurementBackend.choices(), default=MeasurementBackend.DC.value)
+    delta_count = IntegerParameter("Delta readings per point", default=10, minimum=1, maximum=65536)
+    delta_delay = FloatParameter("Delta delay", units="s", default=2e-3)
+    reversal_delay = FloatParameter("Current reversal settling delay", units="s", default=2e-3)
+    track_range = BooleanParameter("Track 2182 Range", default=True)
+    adaptive_integration = BooleanParameter("Adaptive integration (DC backend)", default=False)
+    target_standard_error = FloatParameter("Target standard error", units="V", default=10e-9)
+    min_readings = IntegerParameter("Min readings per point", default=3, minimum=2, maximum=1024)
+    max_readings = IntegerParameter("Max readings per point", default=100, minimum=2, maximum=1024)
+    acquisition_profile = ListParameter("Acquisition Profile", choices=AcquisitionProfile.choices(), default=AcquisitionProfile.CUSTOM)
 
     current_field_constant = FloatParameter("Constant to convert from field to current", units="A/T", default=6.6472*2)
     magnet_ramp_rate = FloatParameter("Magnet Ramp Rate", units="A/s", default=0.1)
+    use_ramp_segments = BooleanParameter("Use Ramp Segments", default=False)
+    fast_ramp_rate = FloatParameter("Ramp Rate at Zero Field", units="A/s", default=0.5)
+    magnet_current_limit = FloatParameter("Magnet Current Limit", units="A", default=60)
     power_amp = FloatParameter("Amperage of heater", units="A", default=1.414)
+    results_file = Parameter("Results File", default="")
+    resume = BooleanParameter("Resume From Checkpoint", default=False)
+    reverse_sweep = BooleanParameter("Reverse Sweep Direction", default=False)
+    continue_from_previous = BooleanParameter("Continue From Previous Run", default=False)
+    hold_at_end = BooleanParameter("Hold Field For Next Run", default=False)
+
+    # Sample temperature read by the last run that started, where the next campaign is ordered from
+    last_temperature = None
 
     # These are the data values that will be measured/collected in the experiment
-    DATA_COLUMNS = ["Resistance (ohm)", "Voltage (V)", "Magnetic Field (T)"]
+    DATA_COLUMNS = ["Resistance (ohm)", "Voltage (V)", "Magnetic Field (T)", "Voltage + (V)", "Voltage - (V)", "Readings"]
+
+    def check_parameters(self):
+        """
+        Raises ValueError for parameter combinations the run cannot be measured with.
+        """
+        if self.adaptive_integration and self.min_readings > self.max_readings:
+            # The 2182 buffer is sized for max_readings, a first block of min_readings would not fit
+            raise ValueError(f"Min readings per point ({self.min_readings}) exceeds max readings per point ({self.max_readings}).")
 
     def startup(self):
         """
         Necessary startup actions (Connecting and configuring to devices).
         """
+        apply_profile_parameters(self, self.acquisition_profile)
+        self.check_parameters()
+
         # Obtain instances of the instruments
         self.ins_manager = LocalInstrumentManager()
         
         self.meter: Keithley2182 = self.ins_manager.get_instrument(LocalInstrument.KEITHLEY_2182)
         self.source:YokogawaGS200  = self.ins_manager.get_instrument(LocalInstrument.YOKOGAWA_GS200)
+        self.delta_source: Keithley6221 = self.ins_manager.get_instrument(LocalInstrument.KEITHLEY_6221)
         self.tctrl: Model336 = self.ins_manager.get_instrument(LocalInstrument.LAKESHORE_MODEL336)  # COM 4 - this is the one that controls sample, magnet, and radiation
         self.magnet: ElectromagnetPowerSupply = self.ins_manager.get_instrument(LocalInstrument.LAKESHORE_LS625) 
         
-        self.ins_manager.reset_instruments()
+        # In a campaign, the previous run may have left the field where this one starts
+        self.ins_manager.reset_instruments(keep_field=self.continue_from_previous)
         log.info("Instruments connected and reset.")
-
-        # Configure the Keithley2182
-        self.meter.active_channel = 1
-        self.meter.channel_function = "voltage"
-        self.meter.ch_1.setup_voltage(auto_range=True, nplc=self.num_plc)
-
-        # Configure the YokogawaGS200
-        self.source.source_mode = "current"
-        self.source.source_range = self.current_limit
-        self.source.source_level = self.set_current
-        self.source.current_limit = self.current_limit
-        self.source.source_enabled = True
-        
-        # Configure LS336 and stabilize at min_temperature
-        self.tctrl.set_heater_pid(2, *HeaterSetting.pid(self.heater_setting))  
-        # intended for low setting, may need to adjust for high
-        # .set_heater_setup Heater 1 @ 50 Ohm, 1 Amp
-        self.tctrl.set_heater_setup(
-            2,
-            self.tctrl.HeaterResistance.HEATER_25_OHM,
-            self.power_amp,
-            self.tctrl.HeaterOutputUnits.POWER,
-        )
-        # .set_heater_output_mode Heater 1 @ closed loop mode, CHANNEL_A for sample stage, True - Remains on after power cycle (?)
-        self.tctrl.set_heater_output_mode(
-            2,
-            self.tctrl.HeaterOutputMode.CLOSED_LOOP,
-            self.tctrl.InputChannel.CHANNEL_A,
-            True,
-        )
-        # setpoint to min temperature and wait until stabilize
-        self.tctrl.set_setpoint_ramp_parameter(2, False, 0)
-        self.tctrl.set_control_setpoint(2, self.set_temperature)
-        self.tctrl.set_heater_range(2, HeaterSetting.range(self.heater_setting))
-
-        # set ramp rate of magnet at 0.1 A/s
-        self.magnet.set_ramp_rate(self.magnet_ramp_rate)
-
-        # heat sample stage to set temperature
-        while True:
-            if self.should_stop():
-                log.warning("Catch stop command in procedure")                
-                return
-            if abs(self.tctrl.get_all_kelvin_reading()[0] - self.set_temperature) < 0.05:
-                log.info("Temperature reached, sleeping 10 seconds for stablization.")
-                break
-            else:
-                log.info(f"Current temeprature: {self.tctrl.get_all_kelvin_reading()[0]}")
-                sleep(1)
+        type(self).last_temperature = sample_temperature(self.tctrl)
+
+        # Command latencies are measured during the run to refine later run-time estimates
+        self.latencies = CommandLatencies.load()
+        self.waiter = CancellableWait(self.should_stop)
+
+        # The heater setpoint goes out first, everything else is set up while the stage heats
+        configure_heater(self.tctrl, self.heater_setting, self.power_amp, self.set_temperature)
+
+        self.plan = self.sweep_plan()
+        # Ramp at magnet_ramp_rate, or faster at low field with the ramp segments
+        self.ramp = plan_ramp(self.magnet_ramp_rate, self.use_ramp_segments, self.fast_ramp_rate, self.magnet_current_limit)
+        delta = MeasurementBackend(self.measurement_backend) == MeasurementBackend.DELTA
+
+        startup = StartupGraph()
+        startup.add("meter", self.configure_meter)
+        # The 6221 drives the 2182 over the trigger link, so it is only set up after the 2182
+        startup.add("source", self.configure_source, *(["meter"] if delta else []))
+        startup.add("temperature", lambda: wait_for_temperature(
+            self.tctrl, self.set_temperature, startup.should_stop(self.should_stop)
+        ))
+        # The field is only moved once the stage is at temperature and the magnet is known to be cold
+        startup.add("magnet", lambda: self.preposition_magnet(startup.should_stop(self.should_stop)), "temperature")
+        steps = startup.run()
+
+        # Measurement starts as soon as the stage is at the set temperature and the magnet in place
+        if not (steps["temperature"] and steps["magnet"]):
+            return
+        log.info("Sleeping 10 seconds for stablization.")
 
         # Let sample stay at min_temperature for 10 seconds to stabilize
         voltage = self.meter.voltage
         log.info(f"Initial Voltage: {voltage}")
-        sleep(10)
-        if self.should_stop():
-            log.warning("Catch stop command in procedure")                
+
+        # From here on the range is fixed from the readings, auto-range is only used after an overflow
+        self.range_tracker = None
+        if self.track_range and MeasurementBackend(self.measurement_backend) != MeasurementBackend.DELTA:
+            self.range_tracker = VoltageRangeTracker(self.meter.ch_1)
+            self.range_tracker.update(voltage)
+        if not self.waiter.sleep(10):
+            log.warning("Catch stop command in procedure")
             return
         
         # Check that temperature of the magnet is cold enough, otherwise shut off experiment
-        if self.tctrl.get_all_kelvin_reading()[1] > 5.1:
+        if magnet_temperature(self.tctrl) > MAX_MAGNET_TEMPERATURE:
             log.warning("Catch stop command in procedure. Magnet overheated")
             self.meter.reset()
             self.tctrl.all_heaters_off()
@@ -149,9 +183,86 @@ class BSweep4ProbeProcedure(Procedure):
             self.ins_manager.close_instruments()
             sys.exit()
         else:
-            log.info(f"Magnet cooled at temperature {self.tctrl.get_all_kelvin_reading()[1]} K")
+            log.info(f"Magnet cooled at temperature {magnet_temperature(self.tctrl)} K")
             
 
+    def sweep_plan(self, field_step=None):
+        """
+        Field setpoints of the sweep, in the direction chosen for it, without the passovers
+        skipped between linked runs of a campaign.
+
+        Args:
+            field_step (float): Spacing of the setpoints, defaults to `field_step`.
+        """
+        if field_step is None:
+            field_step = self.field_step
+        plan = SweepPlan.hysteresis(self.min_field, self.max_field, field_step, self.sweep_type)
+        if self.reverse_sweep:
+            plan = plan.mirrored()
+        if self.continue_from_previous or self.hold_at_end:
+            plan = plan.without_passovers(self.continue_from_previous, self.hold_at_end)
+        return plan
+
+    def configure_meter(self):
+        """
+        Configures the Keithley2182 for the measurement backend.
+        """
+        self.meter.active_channel = 1
+        self.meter.channel_function = "voltage"
+        self.meter.ch_1.setup_voltage(auto_range=True, nplc=self.num_plc)
+        apply_profile(self.acquisition_profile, meter=self.meter)
+        self.latencies.line_frequency = self.meter.line_frequency
+
+        if MeasurementBackend(self.measurement_backend) != MeasurementBackend.DELTA:
+            # Readings are taken with INIT/FETC?, the end of the conversion is signalled
+            # with an SRQ instead of blocking the bus with READ?.
+            self.meter.continuous_initiation_enabled = False
+            self.meter.trigger_immediately()
+            self.polarity = 1
+
+    def configure_source(self):
+        """
+        Configures the current source of the measurement backend and turns the current on.
+        """
+        if MeasurementBackend(self.measurement_backend) == MeasurementBackend.DELTA:
+            # The 6221 alternates the current and triggers the 2182 over the trigger link,
+            # the thermal EMFs cancel out in the delta readings.
+            self.delta_source.configure_delta(self.set_current, self.delta_delay, self.delta_count)
+        else:
+            # Configure the YokogawaGS200
+            self.source.source_mode = "current"
+            self.source.source_range = self.current_limit
+            self.source.source_level = self.set_current
+            self.source.current_limit = self.current_limit
+            self.source.source_enabled = True
+
+    def preposition_magnet(self, should_stop):
+        """
+        Sets up the ramp and brings the magnet to where the sweep starts: the start of the
+        passover, or the first measured field without one, which is where the previous run
+        of a campaign left it. A resumed sweep finds its own way back to the last point, so
+        the magnet is left where it is.
+
+        Returns:
+            bool: False if `should_stop()` became True before the field was reached.
+
+        Raises:
+            RuntimeError: If the magnet is too warm to ramp.
+        """
+        configure_ramp(self.magnet, self.ramp)
+        if self.resume:
+            return True
+        if should_stop():
+            return False
+
+        temperature = magnet_temperature(self.tctrl)
+        if temperature > MAX_MAGNET_TEMPERATURE:
+            raise RuntimeError(f"Magnet overheated ({temperature} K), the field is not moved.")
+
+        target = self.plan.origin
+        log.info(f"Pre-positioning the magnet at {target} T.")
+        return ramp_to_field(self.magnet, target, self.current_field_constant, self.ramp, should_stop)
+
     def execute(self):
         """
         Contains the 'experiment' of the procedure.
@@ -160,73 +271,371 @@ class BSweep4ProbeProcedure(Procedure):
         if self.should_stop():
                 log.warning("Catch stop command in procedure")                
                 return
-        all_field_vals = np_hysteresis(self.min_field, self.max_field, self.field_step, self.sweep_type)
-        fields = all_field_vals["fields"]
-        passover = all_field_vals["passover"]
+        plan = self.plan
+        distance = sum(abs(segment.stop - segment.first) for segment in plan.measured)
+        travelled = 0
+
+        # With adaptive steps, `field_step` is the coarse step used on flat parts of the curve
+        stepper = None
+        if self.adaptive_step:
+            stepper = AdaptiveStepper(self.min_field_step, self.field_step, self.target_voltage_change)
+        points = iter(plan.adaptive_points(stepper) if stepper else plan.points())
+        history = [plan.origin] + [segment.stop for segment in plan.lead_in]
+
+        # The checkpoint next to the results file is updated after every point
+        self.checkpoint = None
+        if self.results_file:
+            if self.resume:
+                self.checkpoint = SweepCheckpoint.load(checkpoint_path(self.results_file))
+            else:
+                setpoints = {"temperature": self.set_temperature, "current": self.set_current}
+                self.checkpoint = SweepCheckpoint(self.results_file, self.parameter_values(), setpoints=setpoints)
+                self.checkpoint.save()
+        completed = self.checkpoint.completed_values("Voltage (V)") if self.resume and self.checkpoint else []
+        if self.checkpoint:
+            self.checkpoint.index = len(completed)
+
+        # A resumed run replays the completed points, so that the adaptive steps come out the same
+        for value in completed:
+            completed_setpoint = next(points)
+            if stepper:
+                stepper.add(completed_setpoint, value)
+            travelled += abs(completed_setpoint - history[-1])
+            history.append(completed_setpoint)
+        setpoint = history[-1]
 
         log.info("Executing experiment.")
         # start ramping
 
-        def vary_field(passover_range):
-            for i, field in enumerate(passover_range):
-                #! Why did they do this? SETF command does not exist.
-                # Means the magnet ramping is purely controlled by the current rate set earlier.
-                self.magnet.set_magnetic_field(field)
+        def vary_field(target):
+            # Nothing is measured in a passover, so the field is ramped to its end in one move
+            if not ramp_to_field(self.magnet, target, self.current_field_constant, self.ramp, self.should_stop):
+                log.warning("Catch stop command in procedure")
+                self.tctrl.all_heaters_off() # TODO: get rid of line later
+                self.abort_sweep()
+                return False
+            return True
+
+        if completed:
+            log.info(f"Resuming after point {len(completed)}. Bringing the field back along its history.")
+            for target in resume_path(history):
+                if not vary_field(target):
+                    return
+        else:
+            for segment in plan.lead_in:
+                log.info("Bring field to required starting point. No measurements recorded yet.")
+                if not vary_field(segment.stop):
+                    return
+                log.info("Field starting point reached. Starting measurements now.")
 
-                sleep(self.field_step * self.current_field_constant / self.magnet.get_ramp_rate()) # wait a minute, calm down, chill out.
-                field = self.magnet.measured_magnetic_field()
-                sleep(5e-3)
+        # main loop
+        # The next setpoint is sent as soon as a point is read, and the point is emitted on a
+        # worker thread while the magnet ramps. A single worker keeps the results in order.
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="results") as recorder:
+            pending = None
+            field = next(points, None)
+            if field is not None:
+                with self.latencies.timed("set_field"):
+                    self.magnet.set_magnetic_field(field)
+                set_at = perf_counter()
+
+            while field is not None:
+                previous, setpoint = setpoint, field
+                # The ramp rate is known from the setup, no RATE? query needed
+                if not self.waiter.until(set_at + ramp_time(previous, setpoint, self.current_field_constant, self.ramp)):
+                    log.warning("Catch stop command in procedure")
+                    self.abort_sweep()
+                    break
+                measurement = self.measure_voltage()
+                if measurement is None:
+                    # Stopped while reading, the point is incomplete and not recorded
+                    log.warning("Catch stop command in procedure")
+                    self.abort_sweep()
+                    break
+                voltage, voltage_plus, voltage_minus = measurement
+                if stepper:
+                    stepper.add(setpoint, voltage)
+                with self.latencies.timed("read_field"):
+                    measured_field = self.magnet.measured_magnetic_field()
+
+                # Point i is read, so the magnet can move on to point i + 1
+                field = next(points, None)
+                if field is not None:
+                    with self.latencies.timed("set_field"):
+                        self.magnet.set_magnetic_field(field)
+                    set_at = perf_counter()
+
+                travelled += abs(setpoint - previous)
+                progress = min(100. * travelled / distance, 100) if distance else 100
+                # Waiting for the previous point bounds the backlog and raises its errors here
+                if pending is not None:
+                    pending.result()
+                pending = recorder.submit(
+                    self.record_point, setpoint, measured_field, voltage, voltage_plus, voltage_minus, self.point_readings, progress
+                )
 
                 if self.should_stop():
                     log.warning("Catch stop command in procedure")
-                    self.tctrl.all_heaters_off() # TODO: get rid of line later
-                    self.ins_manager.reset_instruments()    # close?
+                    self.abort_sweep()
                     break
 
-        if len(passover) != 0:
-            log.info("Bring field to required starting point. No measurements recorded yet.")
-            vary_field(passover[0])
-            log.info("Field starting point reached. Starting measurements now.")
+            if pending is not None:
+                pending.result()
 
-        # main loop
-        for i, field in enumerate(fields):
-            self.magnet.set_magnetic_field(field)
-            sleep(self.field_step * self.current_field_constant / self.magnet.get_ramp_rate()) # wait a minute, calm down, chill out.
-            voltage = self.meter.voltage  # Measure the voltage
-            log.info(f"Voltage measurement: {voltage}")
-            field = self.magnet.measured_magnetic_field()
-            resistance = voltage/self.set_current
-            self.emit(
-                "results",
-                {"Magnetic Field (T)": field, "Voltage (V)": voltage, "Resistance (ohm)": resistance},
-            )
-            self.emit("progress", 100. * i/len(fields))
-            sleep(5e-3)
+        self.completed = field is None
+        if self.completed and self.checkpoint:
+            self.checkpoint.finish()
 
+        for segment in plan.lead_out:
             if self.should_stop():
-                log.warning("Catch stop command in procedure")
-                self.ins_manager.reset_instruments()
-                log.info("Waiting for magnetic field to return to zero.")
-                while abs(self.magnet.measured_magnetic_field()) > 0.0004: 
-                    # check the field in five second intervals
-                    sleep(5)
-                log.info("Field brought to zero successfully.")
                 break
-
-        if len(passover) == 2:
             log.info("Measurements complete. Bringing field back to required final point.")
-            vary_field(passover[1])
+            vary_field(segment.stop)
 
         log.info("Experiment executed")
         toast(f"Experiment executed [{os.path.basename(__file__)}].")
 
+    def record_point(self, setpoint, field, voltage, voltage_plus, voltage_minus, readings, progress):
+        """
+        Emits one measured point and checkpoints it. Runs on the results worker while the magnet
+        ramps to the next point.
+        """
+        log.info(f"Voltage measurement: {voltage}")
+        with self.latencies.timed("emit"):
+            self.emit(
+                "results",
+                {
+                    "Magnetic Field (T)": field,
+                    "Voltage (V)": voltage,
+                    "Resistance (ohm)": voltage / self.set_current,
+                    "Voltage + (V)": voltage_plus,
+                    "Voltage - (V)": voltage_minus,
+                    "Readings": readings,
+                },
+            )
+        self.emit("progress", progress)
+        if self.checkpoint:
+            self.checkpoint.add(field=setpoint)
+
+    def abort_sweep(self):
+        """
+        Stops the magnet and sends the field back to zero at the ramp of the sweep, then resets
+        the other instruments. Returns once the field is seen to descend, so the queue can move
+        on while the magnet ramps down.
+        """
+        try:
+            abort_ramp(self.magnet, self.current_field_constant, self.ramp)
+        finally:
+            self.ins_manager.reset_instruments()
+
+    def measure_voltage(self):
+        """
+        Measures the sample voltage, keeping the 2182 range matched to it when tracked.
+
+        Returns:
+            tuple: (voltage, voltage at +I, voltage at -I), or None if stopped, see `read_voltage`.
+        """
+        measurement = self.read_voltage()
+        if measurement is None or self.range_tracker is None:
+            return measurement
+
+        voltage, voltage_plus, voltage_minus = measurement
+        readings = [v for v in (voltage, voltage_plus, voltage_minus) if not np.isnan(v)]
+        if self.range_tracker.overflowed(*readings):
+            self.range_tracker.fall_back()
+            measurement = self.read_voltage()
+            if measurement is None:
+                return None
+            voltage, voltage_plus, voltage_minus = measurement
+            readings = [v for v in (voltage, voltage_plus, voltage_minus) if not np.isnan(v)]
+
+        self.range_tracker.update(max(abs(v) for v in readings))
+        return voltage, voltage_plus, voltage_minus
+
+    def read_voltage(self):
+        """
+        Measures the sample voltage with the selected measurement backend.
+
+        The number of readings the voltage is averaged from is kept in `point_readings`.
+
+        Returns:
+            tuple: (voltage, voltage at +I, voltage at -I). The last two are only measured
+            in current reversal mode and are NaN otherwise. None if the procedure was stopped
+            before the reading completed.
+        """
+        backend = MeasurementBackend(self.measurement_backend)
+        integration_time = self.latencies.integration_time(self.num_plc)
+
+        if backend == MeasurementBackend.DELTA:
+            self.point_readings = self.delta_count
+            run_time = 2 * self.delta_count * (self.delta_delay + integration_time)
+            with self.latencies.timed("read_delta", offset=run_time):
+                voltage = self.delta_source.measure_delta(run_time, should_stop=self.should_stop)
+            return None if voltage is None else (voltage, np.nan, np.nan)
+
+        if backend == MeasurementBackend.REVERSAL:
+            self.point_readings = 2
+            readings = self.measure_reversal()
+            if readings is None:
+                return None
+            voltage_plus, voltage_minus = readings
+            return (voltage_plus - voltage_minus) / 2, voltage_plus, voltage_minus
+
+        if self.adaptive_integration:
+            reading = self.read_meter_adaptive()
+            if reading is None:
+                return None
+            voltage, self.point_readings = reading
+            return voltage, np.nan, np.nan
+
+        self.point_readings = 1
+        with self.latencies.timed("read_voltage", offset=integration_time):
+            voltage = self.read_meter()
+        return None if voltage is None else (voltage, np.nan, np.nan)
+
+    def read_meter(self):
+        """
+        Takes one 2182 reading, waiting for the end of the integration on the SRQ.
+        Returns None if the procedure was stopped before the reading completed.
+        """
+        self.meter.initiate()
+        request_completion(self.meter)
+        if not wait_for_completion(self.meter, should_stop=self.should_stop, expected=self.latencies.integration_time(self.num_plc)):
+            return None
+        return self.meter.latest_reading
+
+    def read_meter_adaptive(self):
+        """
+        Averages 2182 readings until the standard error of their mean reaches the target,
+        within the min and max number of readings.
+
+        The readings are taken in blocks into the 2182 buffer, and only the buffer statistics
+        are transferred. The size of the next block is predicted from the standard deviation
+        of the readings so far, so usually two blocks are enough.
+
+        Returns:
+            tuple: (mean voltage, number of readings), or None if the procedure was stopped.
+        """
+        integration_time = self.latencies.integration_time(self.num_plc)
+        self.meter.start_statistics_buffer(self.max_readings)
+
+        count = 0
+        block = self.min_readings
+        while block > 0:
+            self.meter.acquire(block)
+            request_completion(self.meter)
+            if not wait_for_completion(self.meter, should_stop=self.should_stop, expected=block * integration_time):
+                return None
+            count += block
+
+            standard_error = self.meter.standard_dev / np.sqrt(count)
+            if standard_error <= self.target_standard_error:
+                break
+            needed = int(np.ceil(count * (standard_error / self.target_standard_error) ** 2))
+            block = min(needed, self.max_readings) - count
+
+        return self.meter.mean, count
+
+    def measure_reversal(self):
+        """
+        Reads the 2182 at both current polarities and returns (V+, V-).
+
+        The point starts at the polarity the previous point ended with, so only one reversal
+        is needed per point. The reversal is sent as soon as the first conversion completes,
+        so the source settles while the first reading is transferred.
+
+        Returns None if the procedure was stopped before both readings were taken.
+        """
+        first = self.polarity
+        readings = {}
+
+        integration_time = self.latencies.integration_time(self.num_plc)
+
+        self.meter.initiate()
+        request_completion(self.meter)
+        if not wait_for_completion(self.meter, should_stop=self.should_stop, expected=integration_time):
+            return None
+        with self.latencies.timed("reverse_current"):
+            self.source.write_source_level(-first * self.set_current)
+        reversed_at = perf_counter()
+        readings[first] = self.meter.latest_reading
+
+        # The source is reversed already, keep track of it even if the point is dropped
+        self.polarity = -first
+        if not self.waiter.until(reversed_at + self.reversal_delay):
+            return None
+        readings[-first] = self.read_meter()
+        if readings[-first] is None:
+            return None
+
+        return readings[1], readings[-1]
+
+    def readout_time(self, latencies):
+        """
+        Expected time to measure the sample at one point with the selected backend.
+        """
+        backend = MeasurementBackend(self.measurement_backend)
+        integration_time = latencies.integration_time(self.num_plc)
+
+        if backend == MeasurementBackend.DELTA:
+            return latencies.get("read_delta") + 2 * self.delta_count * (self.delta_delay + integration_time)
+        if backend == MeasurementBackend.REVERSAL:
+            return (
+                2 * (latencies.get("read_voltage") + integration_time)
+                + latencies.get("reverse_current")
+                + self.reversal_delay
+            )
+        if self.adaptive_integration:
+            # Lower bound, flat regions of the sweep only need the minimum number of readings
+            return latencies.get("read_voltage") + self.min_readings * integration_time
+        return latencies.get("read_voltage") + integration_time
+
     def shutdown(self):
         """
         Shutdown all machines.
         """
         log.info("Shutting down")
-        self.ins_manager.close_instruments()
-        log.info("Instruments closed successfully.")
+        # The field and the heater are left for the next run of a campaign, unless this one was cut short
+        hold = self.hold_at_end and getattr(self, "completed", False)
+        # startup may have failed before connecting the instruments
+        ins_manager = getattr(self, "ins_manager", None)
+        if ins_manager is not None:
+            ins_manager.close_instruments(keep_field=hold, keep_heater=hold)
+            log.info("Instruments closed successfully.")
+
+        try:
+            self.latencies.save()
+        except (AttributeError, OSError) as e:
+            log.warning(f"Could not save the measured command latencies: {e}")
+
+    def get_estimates(self):
+        """
+        Run-time estimate shown in the window before the procedure is queued.
+        """
+        apply_profile_parameters(self, self.acquisition_profile)
+        try:
+            self.check_parameters()
+        except ValueError as e:
+            return [("Invalid parameters", str(e))]
+        latencies = CommandLatencies.load()
+        ramp = plan_ramp(self.magnet_ramp_rate, self.use_ramp_segments, self.fast_ramp_rate, self.magnet_current_limit)
+
+        def estimate(field_step):
+            plan = self.sweep_plan(field_step)
+            return estimate_field_sweep(
+                plan, self.current_field_constant, ramp, self.num_plc, latencies, readout_time=self.readout_time(latencies)
+            )
+
+        phases = estimate(self.field_step)
+        if not self.adaptive_step:
+            return [(phase, format_duration(seconds)) for phase, seconds in phases]
+
+        # Adaptive steps lie between the coarse field_step and min_field_step, so is the run time
+        finest = estimate(self.min_field_step)
+        return [
+            (phase, f"{format_duration(fastest)} - {format_duration(slowest)}")
+            for (phase, fastest), (_, slowest) in zip(phases, finest)
+        ]
 
 
 class BSwep4ProbeWindow(ManagedWindow):
@@ -242,8 +651,25 @@ class BSwep4ProbeWindow(ManagedWindow):
                 "min_field",
                 "max_field",
                 "field_step",
+                "adaptive_step",
+                "min_field_step",
+                "target_voltage_change",
                 "sweep_type",
                 "num_plc",
+                "acquisition_profile",
+                "measurement_backend",
+                "delta_count",
+                "delta_delay",
+                "reversal_delay",
+                "track_range",
+                "adaptive_integration",
+                "target_standard_error",
+                "min_readings",
+                "max_readings",
+                "magnet_ramp_rate",
+                "use_ramp_segments",
+                "fast_ramp_rate",
+                "magnet_current_limit",
             ],
             displays=[
                 "sample_name",
@@ -256,21 +682,142 @@ class BSwep4ProbeWindow(ManagedWindow):
                 "field_step",
                 "sweep_type",
                 "num_plc",
+                "acquisition_profile",
+                "measurement_backend",
+                "delta_count",
+                "delta_delay",
+                "reversal_delay",
             ],
             x_axis="Magnetic Field (T)",
             y_axis="Voltage (V)",
         )
         self.setWindowTitle("4-probe Field Sweep Measurement")
 
+        resume_action = self.menuBar().addAction("Resume Sweep...")
+        resume_action.triggered.connect(self.resume)
+        campaign_action = self.menuBar().addAction("Queue Campaign...")
+        campaign_action.triggered.connect(self.queue_campaign)
+
     def queue(self, procedure=None):
-        procedure = self.make_procedure()
+        if procedure is None:
+            procedure = self.make_procedure()
+        apply_profile_parameters(procedure, procedure.acquisition_profile)
+        try:
+            procedure.check_parameters()
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Queue", str(e))
+            return
         directory = os.path.join(os.path.dirname(__file__), "Results", f"{procedure.sample_name}")
         filename = unique_filename(directory, prefix=f"sample_{procedure.sample_name}_fieldsweep_{procedure.max_field}T_{procedure.set_temperature}K_4probe_{procedure.set_current}A")
+        procedure.results_file = filename
         results = Results(procedure, filename)
         experiment = self.new_experiment(results)
 
         self.manager.queue(experiment)
 
+    def queue_campaign(self):
+        """
+        Queues one sweep per set temperature and field range, with the other parameters taken
+        from the inputs. The campaign scheduler orders the runs to keep the temperature changes
+        short. If asked to, it also links runs that start where the previous one ended, so the
+        field is held between them, otherwise the field returns to zero after every run.
+        """
+        text, ok = QtWidgets.QInputDialog.getText(self, "Queue Campaign", "Set temperatures (K), comma separated:")
+        if not ok or not text.strip():
+            return
+        try:
+            temperatures = [float(value) for value in text.split(",")]
+        except ValueError:
+            QtWidgets.QMessageBox.warning(self, "Queue Campaign", f"Invalid set temperatures: {text!r}")
+            return
+
+        text, ok = QtWidgets.QInputDialog.getText(
+            self, "Queue Campaign", "Max fields (T), comma separated, empty for the Min/Max Field inputs:"
+        )
+        if not ok:
+            return
+        try:
+            max_fields = [abs(float(value)) for value in text.split(",")] if text.strip() else [None]
+        except ValueError:
+            QtWidgets.QMessageBox.warning(self, "Queue Campaign", f"Invalid max fields: {text!r}")
+            return
+
+        order, ok = QtWidgets.QInputDialog.getItem(
+            self, "Queue Campaign", "Order:", CampaignOrder.choices(), CampaignOrder.choices().index(str(CampaignOrder.SERPENTINE)), False
+        )
+        if not ok:
+            return
+
+        hold_field = QtWidgets.QMessageBox.question(
+            self,
+            "Queue Campaign",
+            "Hold the field between runs that start where the previous one ended? Otherwise the field returns to zero after every run.",
+        ) == QtWidgets.QMessageBox.StandardButton.Yes
+
+        template = self.make_procedure().parameter_values()
+        runs = []
+        for temperature in temperatures:
+            for max_field in max_fields:
+                parameters = dict(template, set_temperature=temperature)
+                if max_field is not None:
+                    parameters.update(min_field=-max_field, max_field=max_field)
+                runs.append(CampaignRun(temperature, parameters))
+
+        def campaign_procedure(run):
+            procedure = self.procedure_class()
+            procedure.set_parameters(run.parameters)
+            return procedure
+
+        runs = schedule_campaign(
+            runs,
+            lambda run: campaign_procedure(run).sweep_plan(),
+            order,
+            range_key=lambda run: run.parameters["max_field"],
+            start_temperature=self.start_temperature(),
+            hold_field=hold_field,
+        )
+        for run in runs:
+            procedure = campaign_procedure(run)
+            procedure.reverse_sweep = run.reverse
+            procedure.continue_from_previous = run.continue_from_previous
+            procedure.hold_at_end = run.hold_at_end
+            self.queue(procedure)
+
+    def start_temperature(self):
+        """
+        Temperature the campaign starts from, without talking to the instruments from the GUI:
+        the set temperature of the last experiment still queued or running, otherwise the sample
+        temperature read by the last run that started. None before any run.
+        """
+        pending = [
+            experiment for experiment in self.manager.experiments.queue
+            if experiment.procedure.status in (Procedure.QUEUED, Procedure.RUNNING)
+        ]
+        if pending:
+            return pending[-1].procedure.set_temperature
+        return self.procedure_class.last_temperature
+
+    def resume(self):
+        """
+        Queues the rest of an interrupted sweep from its checkpoint. The temperature is
+        stabilized again and the data is appended to the original results file.
+        """
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Resume Sweep", "", "Sweep checkpoints (*.checkpoint.json)")
+        if not path:
+            return
+
+        checkpoint = SweepCheckpoint.load(path)
+        procedure = self.procedure_class()
+        procedure.set_parameters(checkpoint.parameters)
+        procedure.resume = True
+        log.info(f"Resuming {checkpoint.results_file} after point {checkpoint.index}.")
+
+        # The results file exists, so Results keeps its header and the new points are appended
+        results = Results(procedure, checkpoint.results_file)
+        experiment = self.new_experiment(results)
+
+        self.manager.queue(experiment)
+
 
 def field_sweep_4_probe(mw):
     print("Running Field Sweep 4 Probe experiment...")
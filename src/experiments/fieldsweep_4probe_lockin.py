@@ -1,2 +1,456 @@
+from time import perf_counter
+import logging
+import sys
+import os
+
+import numpy as np
+
+# instrument imports
+from enums.instruments import LocalInstrumentManager, LocalInstrument, ElectromagnetPowerSupply, SR830, Model336, Keithley2182
+
+# pymeasure imports for running the experiment
+from pymeasure.experiment import Procedure, Results, unique_filename
+from pymeasure.experiment.parameters import FloatParameter, BooleanParameter, Parameter, ListParameter
+from pymeasure.display.Qt import QtWidgets
+from pymeasure.display.windows import ManagedWindow
+from helpers.helper_functions import SweepType
+from helpers.sweep_plan import SweepPlan
+from helpers.common import HeaterSetting, AcquisitionProfile
+from helpers.acquisition import apply_profile, apply_profile_parameters
+from helpers.lockin import SettlingScheduler, SensitivityTracker, signal_unit
+from helpers.field_monitor import FieldMonitorCalibration, calibrate_field_monitor
+from helpers.gpib_trigger import GroupTrigger
+from helpers.completion import request_completion, wait_for_completion
+from helpers.runtime_estimator import CommandLatencies
+from helpers.magnet import ramp_time, ramp_to_field, abort_ramp, plan_ramp, configure_ramp
+from helpers.temperature import configure_heater, wait_for_temperature, magnet_temperature, MAX_MAGNET_TEMPERATURE
+from helpers.wait import CancellableWait
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+parent_directory = os.path.dirname(current_directory)
+sys.path.append(parent_directory)
+
+# Set up logging
+log = logging.getLogger("")
+log.addHandler(logging.NullHandler())
+log.setLevel(logging.INFO)
+
+HARMONICS = (1, 2, 3)
+
+
+class BSweep4ProbeLockinProcedure(Procedure):
+    """
+    Field sweep measured with the SR830. At every field point the lock-in cycles through
+    the selected harmonics, so the 1st, 2nd and 3rd harmonic responses are recorded in a
+    single sweep, without repeating the field ramp or the temperature stabilization.
+    """
+
+    sample_name = Parameter("Sample Name", default="DefaultSample")
+    set_temperature = FloatParameter("Set Temperature", units="K", default=9)
+    min_field = FloatParameter("Min Field", units="T", default=-0.1)
+    max_field = FloatParameter("Max Field", units="T", default=0.1)
+    field_step = FloatParameter("Field Step", units="T", default=10e-3)
+    heater_setting = ListParameter("Heater Setting", choices=HeaterSetting.choices(), default=HeaterSetting.LOW)
+    sweep_type = ListParameter("Sweep Type", choices=SweepType.choices(), default=SweepType.B1)
+    sine_voltage = FloatParameter("Excitation Amplitude", units="V", default=0.1)
+    input_config = ListParameter("Input", choices=SR830.INPUT_CONFIGS, default="A")
+    frequency = FloatParameter("Frequency", units="Hz", default=17.777)
+    time_constant = FloatParameter("Time Constant", units="s", default=0.1)
+    filter_slope = ListParameter("Filter Slope", units="dB/oct", choices=SR830.FILTER_SLOPES, default=24)
+    settle_accuracy = FloatParameter("Settling Accuracy", default=1e-3)
+    harmonics = Parameter("Harmonics", default="1")
+    track_sensitivity = BooleanParameter("Track Sensitivity", default=True)
+    field_from_aux = BooleanParameter("Read Field through Lock-in Aux Input", default=False)
+    field_monitor_setup = Parameter("Field Monitor Setup", default="default")
+    field_monitor_aux_input = ListParameter("Field Monitor Aux Input", choices=[1, 2, 3, 4], default=1)
+    recalibrate_field_monitor = BooleanParameter("Recalibrate Field Monitor", default=False)
+    record_dc_voltage = BooleanParameter("Record 2182 DC Voltage", default=False)
+    num_plc = FloatParameter("Number of power line cycles aka. measurement accurac (0.1/1/10)", default=5)
+    synchronized_trigger = BooleanParameter("Trigger Lock-in and 2182 together (GPIB GET)", default=True)
+    acquisition_profile = ListParameter("Acquisition Profile", choices=AcquisitionProfile.choices(), default=AcquisitionProfile.CUSTOM)
+
+    current_field_constant = FloatParameter("Constant to convert from field to current", units="A/T", default=6.6472*2)
+    magnet_ramp_rate = FloatParameter("Magnet Ramp Rate", units="A/s", default=0.1)
+    use_ramp_segments = BooleanParameter("Use Ramp Segments", default=False)
+    fast_ramp_rate = FloatParameter("Ramp Rate at Zero Field", units="A/s", default=0.5)
+    magnet_current_limit = FloatParameter("Magnet Current Limit", units="A", default=60)
+    power_amp = FloatParameter("Amperage of heater", units="A", default=1.414)
+
+    # The lock-in outputs are recorded in the columns of the unit of the input, the others are left empty
+    DATA_COLUMNS = (
+        ["Magnetic Field (T)"] + [f"{axis}{n} (V)" for n in HARMONICS for axis in ("X", "Y")] + ["DC Voltage (V)"]
+        + [f"{axis}{n} (A)" for n in HARMONICS for axis in ("X", "Y")]
+    )
+
+    def selected_harmonics(self):
+        """
+        The harmonics to record, parsed from e.g. "1, 2, 3".
+        """
+        harmonics = sorted({int(n) for n in str(self.harmonics).replace(",", " ").split()})
+        if not harmonics or not set(harmonics) <= set(HARMONICS):
+            raise ValueError(f"Harmonics must be a list of {HARMONICS}, got {self.harmonics!r}.")
+        return harmonics
+
+    def startup(self):
+        """
+        Connect to and configure the lock-in, the magnet and the temperature controller.
+        """
+        apply_profile_parameters(self, self.acquisition_profile)
+        self.waiter = CancellableWait(self.should_stop)
+        self.ins_manager = LocalInstrumentManager()
+
+        self.lockin: SR830 = self.ins_manager.get_instrument(LocalInstrument.STANFORD_SR830)
+        self.tctrl: Model336 = self.ins_manager.get_instrument(LocalInstrument.LAKESHORE_MODEL336)
+        self.magnet: ElectromagnetPowerSupply = self.ins_manager.get_instrument(LocalInstrument.LAKESHORE_LS625)
+
+        self.ins_manager.reset_instruments()
+        log.info("Instruments connected and reset.")
+
+        # Configure the SR830
+        self.lockin.reference_source = "Internal"
+        self.lockin.input_config = self.input_config
+        self.unit = signal_unit(self.input_config)
+        self.lockin.sine_voltage = self.sine_voltage
+        self.lockin.frequency = self.frequency
+        self.lockin.time_constant = self.time_constant
+        self.lockin.filter_slope = self.filter_slope
+        apply_profile(self.acquisition_profile, lockin=self.lockin)
+        self.scheduler = SettlingScheduler(self.lockin, self.settle_accuracy, self.should_stop)
+
+        self.group_trigger = None
+        if self.record_dc_voltage:
+            self.meter: Keithley2182 = self.ins_manager.get_instrument(LocalInstrument.KEITHLEY_2182)
+            self.meter.ch_1.setup_voltage(auto_range=True, nplc=self.num_plc)
+            self.integration_time = CommandLatencies().integration_time(self.num_plc)
+            apply_profile(self.acquisition_profile, meter=self.meter)
+            self.meter.continuous_initiation_enabled = False
+            if self.synchronized_trigger:
+                # Both meters wait for the same GET, the SR830 stores X and Y in its buffer
+                self.meter.trigger_on_bus()
+                self.lockin.channel1 = "X"
+                self.lockin.channel2 = "Y"
+                self.group_trigger = GroupTrigger(self.meter, self.lockin)
+            else:
+                self.meter.trigger_immediately()
+
+        configure_heater(self.tctrl, self.heater_setting, self.power_amp, self.set_temperature)
+        self.ramp = plan_ramp(self.magnet_ramp_rate, self.use_ramp_segments, self.fast_ramp_rate, self.magnet_current_limit)
+        configure_ramp(self.magnet, self.ramp)
+
+        if not wait_for_temperature(self.tctrl, self.set_temperature, self.should_stop):
+            return
+        log.info("Sleeping 10 seconds for stablization.")
+        if not self.waiter.sleep(10):
+            log.warning("Catch stop command in procedure")
+            return
+
+        # Check that temperature of the magnet is cold enough, otherwise shut off experiment
+        if magnet_temperature(self.tctrl) > MAX_MAGNET_TEMPERATURE:
+            log.warning("Catch stop command in procedure. Magnet overheated")
+            self.tctrl.all_heaters_off()
+            self.magnet.set_current(0)
+
+            self.ins_manager.close_instruments()
+            sys.exit()
+
+        self.field_monitor = None
+        if self.field_from_aux:
+            self.load_field_monitor()
+
+        # Range each harmonic once at zero field, the trackers keep one sensitivity per harmonic
+        self.trackers = {}
+        for harmonic in self.selected_harmonics():
+            self.set_harmonic(harmonic)
+            self.scheduler.wait()
+            self.lockin.auto_range(settle_time=self.scheduler.settling_time(), waiter=self.scheduler.waiter)
+            self.trackers[harmonic] = SensitivityTracker(self.lockin, scheduler=self.scheduler)
+
+    def load_field_monitor(self):
+        """
+        Loads the field monitor calibration of this setup. Without one (or if asked to), the
+        monitor is calibrated on the lead-in of the sweep, see `calibrate_field_monitor`.
+        """
+        self.field_monitor = FieldMonitorCalibration.load(self.field_monitor_setup)
+        if self.field_monitor is not None and self.field_monitor.aux_input != int(self.field_monitor_aux_input):
+            self.field_monitor = None
+        if self.recalibrate_field_monitor:
+            self.field_monitor = None
+
+    def calibrate_field_monitor(self, plan):
+        """
+        Calibrates the field monitor against RDGF? on the way to the first measured point, so
+        the sample only sees the fields of the plan's own lead-in and keeps its magnetic history.
+        Without a lead-in the field is read from the supply instead.
+
+        Returns:
+            bool: False if stopped during the calibration.
+        """
+        fields = [plan.origin]
+        for segment in plan.lead_in:
+            fields += [(segment.start + segment.stop) / 2, segment.stop]
+        if len(set(fields)) < 2:
+            log.warning("No lead-in to calibrate the field monitor on, reading the field from the supply.")
+            return True
+
+        log.info(f"Calibrating field monitor for setup '{self.field_monitor_setup}' on the lead-in.")
+        self.field_monitor = calibrate_field_monitor(
+            self.magnet,
+            self.lockin,
+            fields,
+            self.current_field_constant,
+            self.ramp,
+            int(self.field_monitor_aux_input),
+            should_stop=self.should_stop,
+        )
+        if self.field_monitor is None:
+            return False
+        self.field_monitor.save(self.field_monitor_setup)
+        return True
+
+    def set_harmonic(self, harmonic):
+        self.lockin.harmonic = harmonic
+        self.scheduler.harmonic = harmonic
+        self.current_harmonic = harmonic
+
+    def measure_harmonics(self, harmonics, changed_at):
+        """
+        Measures X and Y at each of `harmonics`, in order.
+
+        Args:
+            harmonics (list): Harmonics to measure, starting with the one currently selected
+                so that no switch is needed for the first reading.
+            changed_at (float): `perf_counter()` time at which the field reached the setpoint.
+
+        Returns:
+            dict: The readings by column, or None if the procedure was stopped.
+        """
+        readings = {}
+        for harmonic in harmonics:
+            tracker = self.trackers[harmonic]
+            if harmonic != self.current_harmonic:
+                self.set_harmonic(harmonic)
+                tracker.apply()
+                changed_at = perf_counter()
+
+            self.scheduler.wait(changed_at)
+            if self.track_sensitivity:
+                # Drop the overloads latched while the output was settling
+                self.lockin.clear()
+            if not readings:
+                first = self.measure_first(readings)
+                if first is None:
+                    return None
+                x, y, r = first
+            else:
+                x, y, r = self.lockin.snap("X", "Y", "R")
+
+            if self.track_sensitivity:
+                if self.lockin.is_overloaded():
+                    tracker.update(r, overloaded=True)
+                    self.scheduler.wait()
+                    x, y, r = self.lockin.snap("X", "Y", "R")
+                else:
+                    tracker.update(r)
+
+            readings[f"X{harmonic} ({self.unit})"] = x
+            readings[f"Y{harmonic} ({self.unit})"] = y
+
+        return readings
+
+    def measure_first(self, readings):
+        """
+        Takes the first lock-in reading of a point, together with the field monitor and the
+        2182 when they are read as well. Their values are added to `readings`.
+
+        Returns:
+            tuple: X, Y and R of the lock-in, or None if the procedure was stopped.
+        """
+        if self.group_trigger is not None:
+            self.meter.initiate()
+            # The 2182 completes once the triggered reading is taken
+            request_completion(self.meter)
+            self.lockin.arm_trigger()
+            self.group_trigger.fire()
+            triggered = self.lockin.read_triggered(waiter=self.waiter)
+            if triggered is None:
+                return None
+            x, y = triggered
+            r = np.hypot(x, y)
+            if not wait_for_completion(self.meter, should_stop=self.should_stop, expected=self.integration_time):
+                return None
+            readings["DC Voltage (V)"] = self.meter.latest_reading
+            if self.field_monitor is not None:
+                monitor = getattr(self.lockin, f"aux_in_{self.field_monitor.aux_input}")
+                readings["Magnetic Field (T)"] = self.field_monitor.field(monitor)
+            return x, y, r
+
+        if self.field_monitor is not None:
+            # Field and signal in the same SNAP: one transaction, one timestamp
+            x, y, r, monitor = self.lockin.snap("X", "Y", "R", self.field_monitor.snap_name)
+            readings["Magnetic Field (T)"] = self.field_monitor.field(monitor)
+        else:
+            x, y, r = self.lockin.snap("X", "Y", "R")
+
+        if self.record_dc_voltage:
+            readings["DC Voltage (V)"] = self.meter.voltage
+        return x, y, r
+
+    def execute(self):
+        """
+        Walks the sweep plan and records all selected harmonics at each field point.
+        """
+        if self.should_stop():
+            log.warning("Catch stop command in procedure")
+            return
+        plan = SweepPlan.hysteresis(self.min_field, self.max_field, self.field_step, self.sweep_type)
+        num_points = len(plan)
+        harmonics = self.selected_harmonics()
+
+        log.info("Executing experiment.")
+
+        def vary_field(passover):
+            # Nothing is measured in a passover, so the field is ramped to its end in one move
+            if not ramp_to_field(self.magnet, passover.stop, self.current_field_constant, self.ramp, self.should_stop):
+                log.warning("Catch stop command in procedure")
+                self.abort_sweep()
+                return False
+            return True
+
+        if self.field_from_aux and self.field_monitor is None and not self.calibrate_field_monitor(plan):
+            log.warning("Catch stop command in procedure")
+            self.abort_sweep()
+            return
+
+        for segment in plan.lead_in:
+            log.info("Bring field to required starting point. No measurements recorded yet.")
+            if not vary_field(segment):
+                return
+
+        setpoint = plan.lead_in[-1].stop if plan.lead_in else plan.origin
+        for i, field in enumerate(plan):
+            self.magnet.set_magnetic_field(field)
+            if not self.waiter.sleep(ramp_time(setpoint, field, self.current_field_constant, self.ramp)):
+                log.warning("Catch stop command in procedure")
+                self.abort_sweep()
+                break
+            setpoint = field
+
+            # Alternate the harmonic order, each point starts on the harmonic the previous one ended on
+            order = harmonics if self.current_harmonic == harmonics[0] else harmonics[::-1]
+            readings = self.measure_harmonics(order, perf_counter())
+            if readings is None:
+                log.warning("Catch stop command in procedure")
+                self.abort_sweep()
+                break
+            if self.field_monitor is None:
+                readings["Magnetic Field (T)"] = self.magnet.measured_magnetic_field()
+
+            self.emit("results", {column: readings.get(column, np.nan) for column in self.DATA_COLUMNS})
+            self.emit("progress", 100. * i / num_points)
+
+            if self.should_stop():
+                log.warning("Catch stop command in procedure")
+                self.abort_sweep()
+                break
+
+        for segment in plan.lead_out:
+            if self.should_stop():
+                break
+            log.info("Measurements complete. Bringing field back to required final point.")
+            vary_field(segment)
+
+        log.info("Experiment executed")
+
+    def abort_sweep(self):
+        """
+        Stops the magnet and sends the field back to zero at the ramp of the sweep, then resets
+        the other instruments. Returns once the field is seen to descend, so the queue can move
+        on while the magnet ramps down.
+        """
+        try:
+            abort_ramp(self.magnet, self.current_field_constant, self.ramp)
+        finally:
+            self.ins_manager.reset_instruments()
+
+    def shutdown(self):
+        """
+        Shutdown all machines.
+        """
+        log.info("Shutting down")
+        if getattr(self, "group_trigger", None) is not None:
+            self.group_trigger.close()
+        self.ins_manager.close_instruments()
+        log.info("Instruments closed successfully.")
+
+
+class BSweep4ProbeLockinWindow(ManagedWindow):
+    def __init__(self):
+        super().__init__(
+            procedure_class=BSweep4ProbeLockinProcedure,
+            inputs=[
+                "sample_name",
+                "set_temperature",
+                "heater_setting",
+                "min_field",
+                "max_field",
+                "field_step",
+                "sweep_type",
+                "sine_voltage",
+                "input_config",
+                "frequency",
+                "time_constant",
+                "filter_slope",
+                "settle_accuracy",
+                "harmonics",
+                "track_sensitivity",
+                "field_from_aux",
+                "field_monitor_setup",
+                "field_monitor_aux_input",
+                "recalibrate_field_monitor",
+                "record_dc_voltage",
+                "num_plc",
+                "synchronized_trigger",
+                "acquisition_profile",
+                "magnet_ramp_rate",
+                "use_ramp_segments",
+                "fast_ramp_rate",
+                "magnet_current_limit",
+            ],
+            displays=[
+                "sample_name",
+                "set_temperature",
+                "min_field",
+                "max_field",
+                "field_step",
+                "sweep_type",
+                "frequency",
+                "time_constant",
+                "harmonics",
+            ],
+            x_axis="Magnetic Field (T)",
+            y_axis="X1 (V)",
+        )
+        self.setWindowTitle("4-probe Lock-in Field Sweep Measurement")
+
+    def queue(self, procedure=None):
+        procedure = self.make_procedure()
+        apply_profile_parameters(procedure, procedure.acquisition_profile)
+        directory = os.path.join(os.path.dirname(__file__), "Results", f"{procedure.sample_name}")
+        filename = unique_filename(directory, prefix=f"sample_{procedure.sample_name}_fieldsweep_lockin_{procedure.max_field}T_{procedure.set_temperature}K_{procedure.frequency}Hz")
+        results = Results(procedure, filename)
+        experiment = self.new_experiment(results)
+
+        self.manager.queue(experiment)
+
+
 def field_sweep_4_probe_lockin(mw):
     print("Running Field Sweep 4 Probe with Lock-in experiment...")
+    mw.window = BSweep4ProbeLockinWindow()
+    mw.window.show()
+
+
+if __name__ == "__main__":
+    app = QtWidgets.QApplication([])
+    window = BSweep4ProbeLockinWindow()
+    window.show()
+    app.exec_()
@@ -0,0 +1,241 @@
+from time import perf_counter
+import logging
+import sys
+import os
+
+import numpy as np
+
+# instrument imports
+from enums.instruments import LocalInstrumentManager, LocalInstrument, SR830
+
+# pymeasure imports for running the experiment
+from pymeasure.experiment import Procedure, Results, unique_filename
+from pymeasure.experiment.parameters import FloatParameter, IntegerParameter, BooleanParameter, Parameter, ListParameter
+from pymeasure.display.Qt import QtWidgets
+from pymeasure.display.windows import ManagedWindow
+from helpers.lockin import SettlingScheduler, SensitivityTracker, PhaseCache, settling_time, signal_unit
+from helpers.runtime_estimator import format_duration
+from helpers.common import AcquisitionProfile
+from helpers.acquisition import apply_profile, apply_profile_parameters
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+parent_directory = os.path.dirname(current_directory)
+sys.path.append(parent_directory)
+
+# Set up logging
+log = logging.getLogger("")
+log.addHandler(logging.NullHandler())
+log.setLevel(logging.INFO)
+
+# Rough time for a FREQ write and a SNAP? query over GPIB
+POINT_OVERHEAD = 0.03
+
+
+class FrequencySweepLockinProcedure(Procedure):
+    """
+    Steps the SR830 reference frequency over a linear or logarithmic list and records
+    X, Y, R and theta at each frequency with a single SNAP.
+    """
+
+    sample_name = Parameter("Sample Name", default="DefaultSample")
+    start_frequency = FloatParameter("Start Frequency", units="Hz", default=10)
+    stop_frequency = FloatParameter("Stop Frequency", units="Hz", default=10e3)
+    num_points = IntegerParameter("Number of Frequencies", default=31, minimum=2)
+    spacing = ListParameter("Frequency Spacing", choices=["Logarithmic", "Linear"], default="Logarithmic")
+    sine_voltage = FloatParameter("Excitation Amplitude", units="V", default=0.1)
+    input_config = ListParameter("Input", choices=SR830.INPUT_CONFIGS, default="A")
+    time_constant = FloatParameter("Time Constant", units="s", default=0.1)
+    filter_slope = ListParameter("Filter Slope", units="dB/oct", choices=SR830.FILTER_SLOPES, default=24)
+    settle_accuracy = FloatParameter("Settling Accuracy", default=1e-3)
+    track_sensitivity = BooleanParameter("Track Sensitivity", default=True)
+    auto_phase = BooleanParameter("Auto-phase at each Frequency", default=False)
+    use_phase_cache = BooleanParameter("Reuse Cached Phases", default=True)
+    acquisition_profile = ListParameter("Acquisition Profile", choices=AcquisitionProfile.choices(), default=AcquisitionProfile.CUSTOM)
+
+    # The outputs are recorded in the columns of the unit of the input, the others are left empty
+    DATA_COLUMNS = [
+        "Frequency (Hz)", "X (V)", "Y (V)", "R (V)", "Theta (deg)", "Sensitivity (V)",
+        "X (A)", "Y (A)", "R (A)", "Sensitivity (A)",
+    ]
+
+    def frequencies(self):
+        if self.spacing == "Logarithmic":
+            return np.geomspace(self.start_frequency, self.stop_frequency, self.num_points)
+        return np.linspace(self.start_frequency, self.stop_frequency, self.num_points)
+
+    def startup(self):
+        """
+        Connect to and configure the lock-in.
+        """
+        apply_profile_parameters(self, self.acquisition_profile)
+        self.ins_manager = LocalInstrumentManager()
+        self.lockin: SR830 = self.ins_manager.get_instrument(LocalInstrument.STANFORD_SR830)
+
+        self.lockin.reset()
+        self.lockin.reference_source = "Internal"
+        self.lockin.harmonic = 1
+        self.lockin.input_config = self.input_config
+        self.lockin.sine_voltage = self.sine_voltage
+        self.lockin.time_constant = self.time_constant
+        self.lockin.filter_slope = self.filter_slope
+        apply_profile(self.acquisition_profile, lockin=self.lockin)
+        self.lockin.frequency = self.start_frequency
+        log.info("Lock-in configured.")
+
+        self.scheduler = SettlingScheduler(self.lockin, self.settle_accuracy, self.should_stop)
+        self.phase_cache = PhaseCache()
+
+        self.scheduler.wait()
+        self.lockin.auto_range(settle_time=self.scheduler.settling_time(), waiter=self.scheduler.waiter)
+        self.tracker = SensitivityTracker(self.lockin, scheduler=self.scheduler) if self.track_sensitivity else None
+
+    def execute(self):
+        """
+        Steps through the frequencies, waiting only as long as the output filter needs to settle.
+        """
+        frequencies = self.frequencies()
+        unit = signal_unit(self.input_config)
+        log.info("Executing frequency sweep.")
+
+        for i, frequency in enumerate(frequencies):
+            self.lockin.frequency = frequency
+            # The synchronous filter period depends on the frequency, no need to query the rest again
+            self.scheduler.frequency = frequency
+            changed_at = perf_counter()
+
+            if self.auto_phase:
+                self.set_phase(frequency, changed_at)
+                changed_at = perf_counter()
+
+            self.scheduler.wait(changed_at)
+            if self.tracker is not None:
+                # Drop the overloads latched while the output was settling
+                self.lockin.clear()
+            x, y, r, theta = self.lockin.snap("X", "Y", "R", "Theta")
+
+            if self.tracker is not None:
+                if self.lockin.is_overloaded():
+                    self.tracker.update(r, overloaded=True)
+                    self.scheduler.wait()
+                    x, y, r, theta = self.lockin.snap("X", "Y", "R", "Theta")
+                else:
+                    self.tracker.update(r)
+                sensitivity = self.tracker.sensitivity / self.tracker.input_scale
+            else:
+                sensitivity = self.lockin.sensitivity / self.lockin.input_scale
+
+            readings = {
+                "Frequency (Hz)": frequency,
+                f"X ({unit})": x,
+                f"Y ({unit})": y,
+                f"R ({unit})": r,
+                "Theta (deg)": theta,
+                f"Sensitivity ({unit})": sensitivity,
+            }
+            self.emit("results", {column: readings.get(column, np.nan) for column in self.DATA_COLUMNS})
+            self.emit("progress", 100. * (i + 1) / len(frequencies))
+
+            if self.should_stop():
+                log.warning("Catch stop command in procedure")
+                break
+
+        log.info("Frequency sweep executed")
+
+    def set_phase(self, frequency, changed_at):
+        """
+        Sets the reference phase for `frequency`, from the cache when possible,
+        otherwise by auto-phasing once the output has settled.
+        """
+        phase = self.phase_cache.get(self.sample_name, frequency) if self.use_phase_cache else None
+        if phase is not None:
+            self.lockin.phase = phase
+            return
+
+        self.scheduler.wait(changed_at)
+        self.lockin.auto_phase()
+        self.scheduler.wait()
+        phase = self.lockin.phase
+        self.phase_cache.set(self.sample_name, frequency, phase)
+        log.info(f"Auto-phased at {frequency:.6g} Hz: {phase} deg")
+
+    def shutdown(self):
+        """
+        Store the phases found during the sweep. The lock-in is left as is.
+        """
+        log.info("Shutting down")
+        try:
+            self.phase_cache.save()
+        except (AttributeError, OSError) as e:
+            log.warning(f"Could not save the phase cache: {e}")
+
+    def get_estimates(self):
+        """
+        Run-time estimate shown in the window before the procedure is queued.
+        """
+        apply_profile_parameters(self, self.acquisition_profile)
+        settle = settling_time(self.time_constant, self.filter_slope, self.settle_accuracy)
+        duration = self.num_points * (POINT_OVERHEAD + settle)
+        if self.auto_phase:
+            # Auto-phasing settles before and after APHS, frequencies with a cached phase skip it
+            cache = PhaseCache() if self.use_phase_cache else None
+            auto_phased = sum(1 for frequency in self.frequencies() if cache is None or cache.get(self.sample_name, frequency) is None)
+            duration += auto_phased * 2 * settle
+        return [("Duration", format_duration(duration))]
+
+
+class FrequencySweepLockinWindow(ManagedWindow):
+    def __init__(self):
+        super().__init__(
+            procedure_class=FrequencySweepLockinProcedure,
+            inputs=[
+                "sample_name",
+                "start_frequency",
+                "stop_frequency",
+                "num_points",
+                "spacing",
+                "sine_voltage",
+                "input_config",
+                "time_constant",
+                "filter_slope",
+                "settle_accuracy",
+                "track_sensitivity",
+                "auto_phase",
+                "use_phase_cache",
+                "acquisition_profile",
+            ],
+            displays=[
+                "sample_name",
+                "start_frequency",
+                "stop_frequency",
+                "num_points",
+                "sine_voltage",
+                "time_constant",
+                "filter_slope",
+            ],
+            x_axis="Frequency (Hz)",
+            y_axis="R (V)",
+        )
+        self.setWindowTitle("Lock-in Frequency Sweep")
+
+    def queue(self, procedure=None):
+        procedure = self.make_procedure()
+        apply_profile_parameters(procedure, procedure.acquisition_profile)
+        directory = os.path.join(os.path.dirname(__file__), "Results", f"{procedure.sample_name}")
+        filename = unique_filename(directory, prefix=f"sample_{procedure.sample_name}_freqsweep_{procedure.start_frequency}Hz_{procedure.stop_frequency}Hz_{procedure.sine_voltage}V")
+        results = Results(procedure, filename)
+        experiment = self.new_experiment(results)
+
+        self.manager.queue(experiment)
+
+
+def freq_sweep_lockin(mw):
+    print("Running Lock-in Frequency Sweep experiment...")
+    mw.window = FrequencySweepLockinWindow()
+    mw.window.show()
+
+
+if __name__ == "__main__":
+    app = QtWidgets.QApplication([])
+    window = FrequencySweepLockinWindow()
+    window.show()
+    app.exec_()
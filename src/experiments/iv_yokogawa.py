@@ -41,7 +41,6 @@ Good luck!
 """
 
 import sys
-from time import sleep
 import numpy as np
 import sys
 import os
@@ -57,7 +56,8 @@ from pymeasure.display.windows import ManagedWindow
 from pymeasure.experiment import (
     Procedure, FloatParameter, unique_filename, Results
 )
-from helpers.helper_functions import np_hysteresis
+from helpers.sweep_plan import SweepPlan
+from helpers.wait import CancellableWait
 import logging
 log = logging.getLogger('')
 log.addHandler(logging.NullHandler())
@@ -75,6 +75,7 @@ class IVYokoProcedure(Procedure):
 
     def startup(self):
         log.info("Setting up instruments")
+        self.waiter = CancellableWait(self.should_stop)
         self.meter = Keithley2182("GPIB::7")
         self.meter.reset()
         
@@ -100,10 +101,10 @@ class IVYokoProcedure(Procedure):
         
         
         log.info("Set up complete!")
-        sleep(1)
+        self.waiter.sleep(1)
 
     def execute(self):
-        currents=np_hysteresis(self.min_current, self.max_current, self.current_step)
+        currents = SweepPlan.hysteresis(self.min_current, self.max_current, self.current_step)
         
         steps = len(currents)
 
@@ -114,7 +115,9 @@ class IVYokoProcedure(Procedure):
             self.source.source_level = current
             self.source.source_enabled = True
             # Or use self.source.ramp_to_current(current, delay=0.1)
-            sleep(self.delay * 1e-3)
+            if not self.waiter.sleep(self.delay * 1e-3):
+                log.warning("Catch stop command in procedure")
+                break
 
             voltage = self.meter.voltage
             if abs(current) <= 1e-10:
@@ -1,4 +1,4 @@
-from time import sleep
+from threading import Thread
 from enum import Enum
 import logging
 import sys
@@ -25,6 +25,8 @@ from pint.errors import UndefinedUnitError
 import numpy as np
 
 from helpers.common import HeaterSetting
+from helpers.temperature import configure_heater, wait_for_temperature, magnet_temperature, calibrate_pid_profiles, MAX_MAGNET_TEMPERATURE
+from helpers.wait import CancellableWait
 
 
 current_directory = os.path.dirname(os.path.abspath(__file__))
@@ -42,11 +44,14 @@ ureg = UnitRegistry()
 class SetTemperatureWindow(QMainWindow):
     temperature = FloatParameter("Set temperature", units="K", default=9)
     heater_setting = ListParameter("Heater setting", choices=HeaterSetting.choices(), default=HeaterSetting.LOW)  # Low/Medium/High, to do with Lakeshore 336: refer SOP
+    power_amp = 1.414  # Amperage of heater (A)
 
     def __init__(self):
         super().__init__()
 
         self.button_checked = True
+        self.waiter = CancellableWait()
+        self.worker = None
 
         self.setWindowTitle("Set LS336 Temperature")
         self.setGeometry(100, 100, 400, 300)
@@ -67,10 +72,10 @@ class SetTemperatureWindow(QMainWindow):
         setting_label = QLabel("Heater Setting:")
         layout.addWidget(setting_label)
 
-        setting_selector = QComboBox()
-        setting_selector.addItems(HeaterSetting.choices())
-        setting_selector.currentTextChanged.connect(lambda text: self.on_setting_selected(text))
-        layout.addWidget(setting_selector)
+        self.setting_selector = QComboBox()
+        self.setting_selector.addItems(HeaterSetting.choices())
+        self.setting_selector.currentTextChanged.connect(lambda text: self.on_setting_selected(text))
+        layout.addWidget(self.setting_selector)
 
         execute_btn = QPushButton("Execute")
 
@@ -83,6 +88,20 @@ class SetTemperatureWindow(QMainWindow):
         layout.addWidget(execute_btn)
         layout.setAlignment(execute_btn, Qt.AlignRight)
 
+        stop_btn = QPushButton("Stop")
+        stop_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        stop_btn.clicked.connect(self.on_stop_btn_clicked)
+        stop_btn.setStyleSheet("padding: 10px 20px;")
+        layout.addWidget(stop_btn)
+        layout.setAlignment(stop_btn, Qt.AlignRight)
+
+        calibrate_btn = QPushButton("Calibrate PID")
+        calibrate_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        calibrate_btn.clicked.connect(self.on_calibrate_btn_clicked)
+        calibrate_btn.setStyleSheet("padding: 10px 20px;")
+        layout.addWidget(calibrate_btn)
+        layout.setAlignment(calibrate_btn, Qt.AlignRight)
+
         container = QWidget()
         container.setLayout(layout)
 
@@ -122,7 +141,37 @@ class SetTemperatureWindow(QMainWindow):
         self.heater_setting = HeaterSetting(text)
 
     def on_execute_btn_clicked(self):
-         # Initialize the instruments, see resources.ipynb
+        if self.worker is not None and self.worker.is_alive():
+            log.warning("Set temperature is already running.")
+            return
+
+        # Read the inputs here, the worker thread must not touch the widgets
+        temperature = ureg.Quantity(self.temp_input.text()).to(ureg.kelvin).magnitude
+        heater_setting = HeaterSetting(self.setting_selector.currentText())
+
+        self.waiter.reset()
+        self.worker = Thread(target=self.run, args=(temperature, heater_setting), daemon=True)
+        self.worker.start()
+
+    def on_calibrate_btn_clicked(self):
+        if self.worker is not None and self.worker.is_alive():
+            log.warning("Set temperature is already running.")
+            return
+
+        self.waiter.reset()
+        self.worker = Thread(target=self.run_calibration, daemon=True)
+        self.worker.start()
+
+    def on_stop_btn_clicked(self):
+        log.info("Stopping set temperature.")
+        self.waiter.cancel()
+
+    def closeEvent(self, event):
+        self.waiter.cancel()
+        super().closeEvent(event)
+
+    def run(self, temperature, heater_setting):
+        # Initialize the instruments, see resources.ipynb
         self.tctrl = Model336(
             com_port="COM4"
         )  # COM 4 - this is the one that controls sample, magnet, and radiation
@@ -130,60 +179,47 @@ class SetTemperatureWindow(QMainWindow):
         self.magnet = ElectromagnetPowerSupply("GPIB0::11::INSTR")
         self.tctrl.reset_instrument()
         self.magnet.set_magnetic_field(0)
-        
-        # Configure LS336 and stabilize at min_temperature
-        self.tctrl.set_heater_pid(2, *HeaterSetting.pid(self.heater_setting))  
-        # intended for low setting, may need to adjust for high
-        # .set_heater_setup Heater 1 @ 50 Ohm, 1 Amp
-        self.tctrl.set_heater_setup(
-            2,
-            self.tctrl.HeaterResistance.HEATER_25_OHM,
-            self.power_amp,
-            self.tctrl.HeaterOutputUnits.POWER,
-        )
-        # .set_heater_output_mode Heater 1 @ closed loop mode, CHANNEL_A for sample stage, True - Remains on after power cycle (?)
-        self.tctrl.set_heater_output_mode(
-            2,
-            self.tctrl.HeaterOutputMode.CLOSED_LOOP,
-            self.tctrl.InputChannel.CHANNEL_A,
-            True,
-        )
-        # setpoint to min temperature and wait until stabilize
-        self.tctrl.set_setpoint_ramp_parameter(2, False, 0)
-        self.tctrl.set_control_setpoint(2, self.temperature)
-        self.tctrl.set_heater_range(2, HeaterSetting.range(self.heater_setting))
-
-        # heat sample stage to set temperature
-        while True:
-            if self.should_stop():
-                log.warning("Catch stop command in procedure")                
+
+        try:
+            # Configure LS336 and heat sample stage to set temperature
+            configure_heater(self.tctrl, heater_setting, self.power_amp, temperature)
+            if not wait_for_temperature(self.tctrl, temperature, self.waiter.cancelled):
                 return
-            if abs(self.tctrl.get_all_kelvin_reading()[0] - self.temperature) < 0.05:
-                log.info("Temperature reached, sleeping 10 seconds for stablization.")
-                break
-            else:
-                log.info(f"Current temperature: {self.tctrl.get_all_kelvin_reading()[0]}")
-                sleep(1)
-
-        # Let sample stay at min_temperature for 10 seconds to stabilize
-        sleep(10)
-        if self.should_stop():
-            log.warning("Catch stop command in procedure")                
-            return
-        
-        # Check that temperature of the magnet is cold enough, otherwise show error and stop heating
-        if self.tctrl.get_all_kelvin_reading()[1] > 5.1:
-            log.warning("Catch stop command in procedure. Magnet overheated")
+
+            # Let sample stay at set temperature for 10 seconds to stabilize
+            log.info("Temperature reached, waiting 10 seconds for stabilization.")
+            if not self.waiter.sleep(10):
+                log.warning("Catch stop command in procedure")
+                return
+
+            # Check that temperature of the magnet is cold enough, otherwise show error and stop heating
+            temperature = magnet_temperature(self.tctrl)
+            if temperature > MAX_MAGNET_TEMPERATURE:
+                log.warning("Catch stop command in procedure. Magnet overheated")
+                self.tctrl.all_heaters_off()
+                self.magnet.set_current(0)
+                return
+            log.info(f"Magnet cooled at temperature {temperature} K")
+        finally:
+            log.info("Shutting down")
+            self.magnet.set_magnetic_field(0)
+            self.tctrl.disconnect_usb()
+
+    def run_calibration(self):
+        # Step responses of every temperature band, the fitted profiles are used by the "Auto" heater setting
+        self.tctrl = Model336(
+            com_port="COM4"
+        )  # COM 4 - this is the one that controls sample, magnet, and radiation
+        log.info("Model 336 is read")
+
+        try:
+            profiles = calibrate_pid_profiles(self.tctrl, self.power_amp, should_stop=self.waiter.cancelled)
+            log.info(f"PID profiles: {profiles.profiles}")
+        finally:
+            log.info("Shutting down")
             self.tctrl.all_heaters_off()
-            self.magnet.set_current(0)
-            sys.exit()
-        else:
-            log.info(f"Magnet cooled at temperature {self.tctrl.get_all_kelvin_reading()[1]} K")
+            self.tctrl.disconnect_usb()
 
-        log.info("Shutting down")
-        self.magnet.set_magnetic_field(0)
-        self.tctrl.disconnect_usb()
-    
 
 def set_temperature(mw):
     print("Running Set Temperature Utility...")
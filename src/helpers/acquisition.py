@@ -0,0 +1,91 @@
+import logging
+
+from helpers.common import AcquisitionProfile
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Settings of every named profile, shared by all instruments taking part in a measurement
+PROFILES = {
+    AcquisitionProfile.FAST_SCAN: {
+        "nplc": 1,
+        "auto_zero": False,
+        "display": False,
+        "auto_range": False,
+        "reserve": "Normal",
+        "time_constant": 30e-3,
+        "filter_slope": 12,
+    },
+    AcquisitionProfile.STANDARD: {
+        "nplc": 5,
+        "auto_zero": True,
+        "display": True,
+        "auto_range": True,
+        "reserve": "Normal",
+        "time_constant": 100e-3,
+        "filter_slope": 24,
+    },
+    AcquisitionProfile.PRECISION: {
+        "nplc": 10,
+        "auto_zero": True,
+        "display": False,
+        "auto_range": True,
+        "reserve": "Low Noise",
+        "time_constant": 300e-3,
+        "filter_slope": 24,
+    },
+}
+
+# Procedure parameters that are set by a profile, so that they end up in the results header
+PROFILE_PARAMETERS = {
+    "num_plc": "nplc",
+    "time_constant": "time_constant",
+    "filter_slope": "filter_slope",
+}
+
+
+def profile_settings(profile):
+    """
+    Returns the settings of `profile`, or None for the custom profile.
+    """
+    return PROFILES.get(AcquisitionProfile(profile))
+
+
+def apply_profile_parameters(procedure, profile):
+    """
+    Overwrites the procedure parameters covered by `profile` (NPLC, time constant, ...).
+    Call it before the results file is created, so the header holds the values used.
+
+    Args:
+        procedure (Procedure): The procedure to update, parameters it does not have are skipped.
+        profile (AcquisitionProfile or str): The profile to apply.
+    """
+    settings = profile_settings(profile)
+    if settings is None:
+        return
+
+    for parameter, setting in PROFILE_PARAMETERS.items():
+        if hasattr(procedure, parameter):
+            setattr(procedure, parameter, settings[setting])
+
+
+def apply_profile(profile, meter=None, lockin=None):
+    """
+    Configures every given instrument for `profile`, with one write per instrument.
+    Nothing is changed for the custom profile.
+
+    Args:
+        profile (AcquisitionProfile or str): The profile to apply.
+        meter (Keithley2182): Nanovoltmeter, or None.
+        lockin (SR830): Lock-in amplifier, or None.
+    """
+    settings = profile_settings(profile)
+    if settings is None:
+        return
+
+    if meter is not None:
+        meter.configure_acquisition(settings["nplc"], settings["auto_zero"], settings["display"], settings["auto_range"])
+    if lockin is not None:
+        lockin.configure_acquisition(settings["reserve"], settings["time_constant"], settings["filter_slope"])
+
+    log.info(f"Acquisition profile '{AcquisitionProfile(profile)}' applied.")
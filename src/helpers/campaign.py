@@ -0,0 +1,122 @@
+from itertools import groupby
+import logging
+
+from helpers.common import CampaignOrder
+from helpers.magnet import FIELD_TOLERANCE
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class CampaignRun(object):
+    """
+    One sweep of a campaign: its set temperature, the procedure parameters of the sweep, and
+    how the scheduler links it to its neighbours.
+
+    `reverse` runs the sweep with the field reversed, `continue_from_previous` skips the lead-in
+    because the previous run left the field where this one starts, and `hold_at_end` skips the
+    lead-out and leaves the field (and the heater) for the next run.
+    """
+
+    def __init__(self, temperature, parameters=None):
+        self.temperature = temperature
+        self.parameters = dict(parameters or {})
+        self.reverse = False
+        self.continue_from_previous = False
+        self.hold_at_end = False
+
+    def __repr__(self):
+        return f"CampaignRun({self.temperature} K, reverse={self.reverse}, continue={self.continue_from_previous}, hold={self.hold_at_end})"
+
+
+def order_runs(runs, order=CampaignOrder.SERPENTINE, range_key=None, start_temperature=None):
+    """
+    Orders the runs of a campaign to keep the cryostat and magnet transitions short.
+
+    The temperatures are visited monotonically, starting from the end closest to
+    `start_temperature` (from the lowest one if it is not known, heating is faster than cooling).
+    Within a temperature the runs are sorted by `range_key`, and with the serpentine order that
+    sort alternates between temperatures, so consecutive temperatures meet on the same field range.
+
+    Args:
+        runs (list): CampaignRun objects.
+        order (CampaignOrder or str): How to order the runs.
+        range_key (function): Returns the sort key of the field range of a run, e.g. its max field.
+        start_temperature (float): Current temperature of the stage (K), if known.
+
+    Returns:
+        list: The runs in measurement order.
+    """
+    order = CampaignOrder(order)
+    if order == CampaignOrder.AS_QUEUED:
+        return list(runs)
+
+    temperatures = sorted({run.temperature for run in runs})
+    if start_temperature is not None and abs(temperatures[-1] - start_temperature) < abs(temperatures[0] - start_temperature):
+        temperatures.reverse()
+    position = {temperature: i for i, temperature in enumerate(temperatures)}
+
+    ordered = []
+    by_temperature = sorted(runs, key=lambda run: position[run.temperature])
+    for i, (_, group) in enumerate(groupby(by_temperature, key=lambda run: run.temperature)):
+        group = list(group)
+        if range_key is not None:
+            group.sort(key=range_key, reverse=order == CampaignOrder.SERPENTINE and i % 2 == 1)
+        ordered.extend(group)
+    return ordered
+
+
+def link_runs(runs, plan):
+    """
+    Chooses the direction of every run so that it starts on the field the previous run ended on,
+    preferring to alternate the direction, and drops the return to zero between linked runs.
+
+    B2 runs start at zero and end at their max field, in either direction, so consecutive B2
+    runs are never linked and the field still returns to zero between them.
+
+    Args:
+        runs (list): CampaignRun objects in measurement order, updated in place.
+        plan (function): Returns the SweepPlan of a run, in its normal direction.
+
+    Returns:
+        int: Number of returns to zero that were skipped.
+    """
+    skipped = 0
+    previous = None
+    for run in runs:
+        run.reverse = False
+        run.continue_from_previous = False
+        run.hold_at_end = False
+
+        normal = plan(run)
+        if previous is not None:
+            end_field = previous_plan.end_field
+            # Try the opposite direction of the previous run first, so that the sweeps alternate
+            for reverse in (not previous.reverse, previous.reverse):
+                candidate = normal.mirrored() if reverse else normal
+                if abs(candidate.start_field - end_field) < FIELD_TOLERANCE:
+                    run.reverse = reverse
+                    run.continue_from_previous = True
+                    previous.hold_at_end = True
+                    skipped += 1
+                    break
+
+        previous = run
+        previous_plan = normal.mirrored() if run.reverse else normal
+
+    log.info(f"Campaign of {len(runs)} runs, {skipped} returns to zero field skipped.")
+    return skipped
+
+
+def schedule_campaign(runs, plan, order=CampaignOrder.SERPENTINE, range_key=None, start_temperature=None, hold_field=False):
+    """
+    Orders the runs of a campaign with `order_runs`. With `hold_field`, the runs are then linked
+    with `link_runs`, otherwise the field returns to zero after every run.
+
+    Returns:
+        list: The runs in measurement order.
+    """
+    runs = order_runs(runs, order, range_key, start_temperature)
+    if hold_field:
+        link_runs(runs, plan)
+    return runs
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+
+import pandas as pd
+from pymeasure.experiment.results import Results
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+COMMENT = Results.COMMENT
+
+
+def checkpoint_path(results_file):
+    """Checkpoint file kept next to `results_file`."""
+    return os.path.splitext(results_file)[0] + ".checkpoint.json"
+
+
+class SweepCheckpoint(object):
+    """
+    Progress of a sweep, saved after every point so that an interrupted run can be resumed
+    from the last completed point, appending to the same results file.
+
+    Only what the results file does not hold is kept: the procedure `parameters`, from which the
+    sweep plan is rebuilt, the `index` of the next point and the `setpoints` the instruments were
+    last set to. The completed points themselves are read back from the results file on resume.
+    """
+
+    def __init__(self, results_file, parameters, index=0, setpoints=None):
+        self.results_file = results_file
+        self.parameters = dict(parameters)
+        self.index = index
+        self.setpoints = dict(setpoints or {})
+
+    @property
+    def path(self):
+        return checkpoint_path(self.results_file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["results_file"], data["parameters"], data["index"], data["setpoints"])
+
+    def save(self):
+        # Written to a temporary file first, so a crash while writing leaves the previous checkpoint
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(
+                {
+                    "results_file": self.results_file,
+                    "parameters": self.parameters,
+                    "index": self.index,
+                    "setpoints": self.setpoints,
+                },
+                f,
+            )
+        os.replace(temporary, self.path)
+
+    def add(self, **setpoints):
+        """Records a completed point and saves the checkpoint."""
+        self.index += 1
+        self.setpoints.update(setpoints)
+        self.save()
+
+    def completed_values(self, column):
+        """
+        Values of `column` at the completed points, read from the results file.
+
+        The results are written by the recorder thread, so the file can be a point behind or
+        ahead of `index` after a crash; the file wins, since that is what gets appended to.
+        """
+        values = pd.read_csv(self.results_file, comment=COMMENT)[column].tolist()
+        if len(values) != self.index:
+            log.warning(f"Checkpoint is at point {self.index}, {self.results_file} holds {len(values)}, resuming after the latter.")
+        return values
+
+    def finish(self):
+        """Removes the checkpoint once the sweep is complete, there is nothing left to resume."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        log.info(f"Sweep complete, checkpoint {self.path} removed.")
+
+
+def resume_path(history):
+    """
+    Fields to ramp through, without measuring, to bring the magnet back to the last field of
+    `history` with the same magnetic history: the last turning point of the sweep, then the
+    last field, so it is approached from the same side as in the original run.
+
+    Args:
+        history (list): Every field the sweep went through, in order, starting from its origin.
+    """
+    turning = history[0]
+    direction = 0
+    for previous, field in zip(history, history[1:]):
+        step = field - previous
+        if step == 0:
+            continue
+        if direction and (step > 0) != (direction > 0):
+            turning = previous
+        direction = step
+    return [turning, history[-1]]
@@ -1,10 +1,15 @@
+import os
 from enum import Enum
 from lakeshore import Model336
 
+# Local, per-setup data (calibrations, measured latencies, ...) that is not part of a results file.
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
 class HeaterSetting(Enum):
     LOW = "Low (PID: 50, 50, 0 ; Range: Low)"
     MEDIUM = "Medium (PID: 100, 50, 0 ; Range: Medium)"
     HIGH = "High (PID: 100, 50, 0 ; Range: High)"
+    AUTO = "Auto (calibrated PID profile for the set temperature)"
 
     def __str__(self):
         return self.value
@@ -40,4 +45,41 @@ class CurrentSource(Enum):
 
     @classmethod
     def choices(cls):
-        return [choice.value for choice in cls]
\ No newline at end of file
+        return [choice.value for choice in cls]
+
+class MeasurementBackend(Enum):
+    DC = "DC (Yokogawa GS200 + Keithley 2182)"
+    DELTA = "Delta mode (Keithley 6221 + 2182)"
+    REVERSAL = "Current reversal (Yokogawa GS200 + Keithley 2182)"
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def choices(cls):
+        return [choice.value for choice in cls]
+
+class AcquisitionProfile(Enum):
+    CUSTOM = "Custom (procedure parameters)"
+    FAST_SCAN = "Fast scan"
+    STANDARD = "Standard"
+    PRECISION = "Precision"
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def choices(cls):
+        return [choice.value for choice in cls]
+
+class CampaignOrder(Enum):
+    AS_QUEUED = "As queued"
+    MONOTONIC = "Monotonic temperature"
+    SERPENTINE = "Monotonic temperature, serpentine field range"
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def choices(cls):
+        return [choice.value for choice in cls]
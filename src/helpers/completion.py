@@ -0,0 +1,97 @@
+from time import perf_counter
+import logging
+
+from pyvisa import VisaIOError
+from pyvisa.constants import EventType, EventMechanism, StatusCode
+
+from helpers.wait import CancellableWait
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Event summary bit of the IEEE 488.2 status byte, set once *OPC fires with *ESE 1
+EVENT_SUMMARY_BIT = 32
+
+# Longest single wait on a VISA event, so that stop requests are still noticed
+EVENT_SLICE = 0.1
+
+
+def request_completion(instrument):
+    """
+    Asks `instrument` to request service (SRQ) once its pending operations are complete.
+    Send it right after the command to wait for, e.g. the 2182 :INIT, then call
+    `wait_for_completion`.
+
+    Args:
+        instrument (Instrument): Any IEEE 488.2 instrument.
+    """
+    instrument.write("*CLS;*ESE 1;*SRE 32;*OPC")
+
+
+def _srq_events_enabled(connection):
+    try:
+        connection.enable_event(EventType.service_request, EventMechanism.queue)
+        return True
+    except (AttributeError, VisaIOError):
+        return False
+
+
+def _status_byte(instrument, connection):
+    try:
+        # Serial poll on GPIB, no message goes over the bus
+        return connection.read_stb()
+    except (AttributeError, VisaIOError):
+        return int(instrument.ask("*STB?"))
+
+
+def wait_for_completion(instrument, timeout=60, should_stop=lambda: False, expected=0, poll_interval=10e-3):
+    """
+    Blocks until `instrument` signals the completion requested with `request_completion`.
+
+    On GPIB the wait is driven by the SRQ line through VISA events, without polling the bus.
+    Otherwise, or if the VISA library does not support events, the status byte is polled
+    every `poll_interval`.
+
+    Args:
+        instrument (Instrument): The instrument to wait for.
+        timeout (float): Longest wait (s).
+        should_stop (function): Returns True to give up waiting.
+        expected (float): Time the operation is known to take at least (s), spent without
+            talking to the instrument.
+        poll_interval (float): Status byte polling interval when SRQ events are unavailable (s).
+
+    Returns:
+        bool: True once complete, False if `should_stop()` became True first.
+    """
+    waiter = CancellableWait(should_stop)
+    deadline = perf_counter() + timeout
+    if expected > 0 and not waiter.sleep(expected):
+        return False
+
+    connection = getattr(instrument.adapter, "connection", None)
+    use_events = _srq_events_enabled(connection)
+    try:
+        while True:
+            # The SRQ may have been raised before the events were enabled, check the status first
+            if _status_byte(instrument, connection) & EVENT_SUMMARY_BIT:
+                instrument.write("*CLS")
+                return True
+            if should_stop():
+                return False
+
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"{instrument.name} did not complete within {timeout} s.")
+
+            if use_events:
+                try:
+                    connection.wait_on_event(EventType.service_request, max(int(1e3 * min(remaining, EVENT_SLICE)), 1))
+                except VisaIOError as e:
+                    if e.error_code != StatusCode.error_timeout:
+                        raise
+            elif not waiter.sleep(min(poll_interval, remaining)):
+                return False
+    finally:
+        if use_events:
+            connection.disable_event(EventType.service_request, EventMechanism.queue)
+            connection.discard_events(EventType.service_request, EventMechanism.queue)
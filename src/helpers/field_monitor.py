@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from helpers.common import DATA_DIRECTORY
+from helpers.magnet import ramp_to_field
+from helpers.wait import CancellableWait
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+FIELD_MONITOR_FILE = os.path.join(DATA_DIRECTORY, "field_monitor_calibrations.json")
+
+
+class FieldMonitorCalibration(object):
+    """
+    Linear calibration of the magnet supply's analog field monitor, wired into one of the
+    SR830 aux inputs: field = slope * voltage + offset.
+
+    Calibrations are stored per setup name, since they depend on the wiring and the magnet.
+    """
+
+    def __init__(self, slope, offset=0, aux_input=1):
+        self.slope = slope
+        self.offset = offset
+        self.aux_input = aux_input
+
+    @property
+    def snap_name(self):
+        """Name of the aux input for `SR830.snap`."""
+        return f"Aux In {self.aux_input}"
+
+    def field(self, voltage):
+        return self.slope * voltage + self.offset
+
+    @staticmethod
+    def _load_all(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def load(cls, setup, path=FIELD_MONITOR_FILE):
+        """
+        Returns the calibration stored for `setup`, or None if it was never calibrated.
+        """
+        calibration = cls._load_all(path).get(setup)
+        if calibration is None:
+            return None
+        return cls(calibration["slope"], calibration["offset"], calibration["aux_input"])
+
+    def save(self, setup, path=FIELD_MONITOR_FILE):
+        calibrations = self._load_all(path)
+        calibrations[setup] = {"slope": self.slope, "offset": self.offset, "aux_input": self.aux_input}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(calibrations, f, indent=4)
+
+
+def calibrate_field_monitor(magnet, lockin, fields, current_field_constant, ramp, aux_input=1, settle_time=1, should_stop=None):
+    """
+    Fits the field monitor calibration against the magnet supply's own field reading,
+    visiting `fields` in order.
+
+    Args:
+        magnet (ElectromagnetPowerSupply): The magnet supply.
+        lockin (SR830): The lock-in whose aux input reads the field monitor.
+        fields (list): Fields to calibrate at, at least two different ones (T).
+        current_field_constant (float): Current per field of the magnet (A/T).
+        ramp (float or RampProfile): Ramp rate set on the supply (A/s), or its ramp segments.
+        aux_input (int): Aux input (1 to 4) the monitor is wired to.
+        settle_time (float): Extra wait once the field should have been reached (s).
+        should_stop (function): Returns True to abandon the calibration.
+
+    Returns:
+        FieldMonitorCalibration: The fitted calibration, or None if stopped.
+    """
+    waiter = CancellableWait(should_stop)
+    voltages = []
+    measured_fields = []
+    for field in fields:
+        if not ramp_to_field(magnet, field, current_field_constant, ramp, waiter.cancelled) or not waiter.sleep(settle_time):
+            return None
+        voltages.append(getattr(lockin, f"aux_in_{aux_input}"))
+        measured_fields.append(magnet.measured_magnetic_field())
+
+    slope, offset = np.polyfit(voltages, measured_fields, 1)
+    residual = np.max(np.abs(np.polyval((slope, offset), voltages) - measured_fields))
+    log.info(f"Field monitor calibration: {slope:.6g} T/V, offset {offset:.6g} T, max residual {residual:.3g} T")
+
+    return FieldMonitorCalibration(float(slope), float(offset), aux_input)
@@ -0,0 +1,55 @@
+import logging
+
+import pyvisa
+from pyvisa.resources import GPIBInstrument
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class GroupTrigger(object):
+    """
+    Triggers several GPIB instruments at the same instant with a single group execute
+    trigger (GET) from the board.
+
+    The instruments must be armed to wait for a bus trigger first. If they are not all
+    GPIB instruments on the same board, or the board interface cannot be opened, the
+    trigger falls back to calling `trigger()` on each instrument in turn.
+    """
+
+    def __init__(self, *instruments):
+        self.instruments = instruments
+        self.connections = [getattr(instrument.adapter, "connection", None) for instrument in instruments]
+        self.interface = None
+
+        if not all(isinstance(connection, GPIBInstrument) for connection in self.connections):
+            log.warning("Not all instruments are on GPIB, triggering them one after the other.")
+            return
+
+        boards = {connection.interface_number for connection in self.connections}
+        if len(boards) > 1:
+            log.warning("Instruments are on different GPIB boards, triggering them one after the other.")
+            return
+
+        try:
+            manager = getattr(instruments[0].adapter, "manager", None) or pyvisa.ResourceManager()
+            self.interface = manager.open_resource(f"GPIB{boards.pop()}::INTFC")
+        except pyvisa.Error as e:
+            log.warning(f"Could not open the GPIB board, triggering instruments one after the other: {e}")
+
+    @property
+    def synchronized(self):
+        """True if the instruments are triggered by one GET."""
+        return self.interface is not None
+
+    def fire(self):
+        if self.interface is not None:
+            self.interface.group_execute_trigger(*self.connections)
+        else:
+            for instrument in self.instruments:
+                instrument.trigger()
+
+    def close(self):
+        if self.interface is not None:
+            self.interface.close()
+            self.interface = None
@@ -2,6 +2,7 @@ import numpy as np
 from pymeasure.experiment.parameters import ListParameter
 
 from enums.sweep_type import SweepType
+from helpers.sweep_plan import SweepPlan
 
 def np_linear(min_value, max_value, step_value):
     # Calculate the number of points
@@ -17,43 +18,21 @@ def np_linear(min_value, max_value, step_value):
     return values
 
 def tabular_values(start_values, end_values, step_values):
-    if len(start_values) != len(end_values) or len(start_values) != len(step_values):
-        raise ValueError("Start values, end values, and step values must all have the same length.")
-    
-    values = []
-    for i in range(len(start_values)):
-        new_values = list(np_linear(start_values[i], end_values[i], step_values[i]))
-        if values and new_values[0] == values[-1]:
-            new_values = new_values[1:]
-        values += new_values
-    
-    return np.array(values)                      
+    plan = SweepPlan.tabular(start_values, end_values, step_values)
+    return np.fromiter(plan, dtype=float, count=len(plan))
 
 def np_hysteresis(low, high, step, type = SweepType.B1):
-    result = {}
-    up = np_linear(0, high, step)
-    down = np_linear(high-step, low, -step)
-    up2 = np_linear(low+step, high, step)
-    down2 = np_linear(high-step, 0, -step)
-    
-    if type == SweepType.B1:
-        up2 = np_linear(low+step, 0, step)
-        result = {
-            "fields": np.concatenate((up, down, up2)),
-            "passover": []
-        }
-    elif type == SweepType.B2:
-        result = {
-            "fields": np.concatenate((up, down, up2)),
-            "passover": [down2]
-        }
-    elif type == SweepType.B3:
-        result = {
-            "fields": np.concatenate((down, up2)),
-            "passover": [up, down2]
-        }
-
-    return result
+    """
+    Eager version of `SweepPlan.hysteresis`, kept for callers that need full arrays.
+    Prefer iterating the plan directly, which keeps the branch structure and does not
+    allocate the points up front.
+    """
+    plan = SweepPlan.hysteresis(low, high, step, type)
+    passover = [np.fromiter(segment, dtype=float, count=len(segment)) for segment in plan.segments if not segment.measured]
+    return {
+        "fields": np.fromiter(plan, dtype=float, count=len(plan)),
+        "passover": passover,
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+from collections import deque
+from math import exp, factorial
+from time import perf_counter
+import json
+import os
+
+from helpers.common import DATA_DIRECTORY
+from helpers.wait import CancellableWait
+
+PHASE_CACHE_FILE = os.path.join(DATA_DIRECTORY, "phase_cache.json")
+
+# The synchronous filter is only active below this detection frequency.
+SYNCHRONOUS_FILTER_MAX_FREQUENCY = 200
+
+# SR830 input configurations that measure a current, the outputs are then in A
+CURRENT_INPUT_CONFIGS = ("I (1 MOhm)", "I (100 MOhm)")
+
+
+def signal_unit(input_config):
+    """Unit of the SR830 outputs (X, Y, R and the sensitivity) with `input_config`."""
+    return "A" if input_config in CURRENT_INPUT_CONFIGS else "V"
+
+
+def settling_time(time_constant, filter_slope, accuracy=1e-3, synchronous=False, detection_frequency=None):
+    """
+    Time for the SR830 output to settle within `accuracy` of its final value after a step.
+
+    The output filter is a cascade of `filter_slope / 6` identical RC stages, whose remaining
+    error after a time x * time_constant is exp(-x) * sum_{k<n} x^k / k!. This gives the
+    usual 4.6, 6.6, 8.4 and 10 time constants at 1% for 6, 12, 18 and 24 dB/oct. The
+    synchronous filter, when active, adds one period of the detection frequency.
+
+    Args:
+        time_constant (float): Output filter time constant (s).
+        filter_slope (int): Output filter slope (6, 12, 18 or 24 dB/oct).
+        accuracy (float): Relative error that is acceptable once settled.
+        synchronous (bool): Whether the synchronous filter is enabled.
+        detection_frequency (float): Reference frequency times the harmonic (Hz).
+
+    Returns:
+        float: Settling time in seconds.
+    """
+    poles = max(int(filter_slope) // 6, 1)
+
+    def remaining(x):
+        return exp(-x) * sum(x ** k / factorial(k) for k in range(poles))
+
+    # remaining() decreases monotonically, so bisect on it
+    low, high = 0.0, 1.0
+    while remaining(high) > accuracy:
+        high *= 2
+    for _ in range(50):
+        middle = (low + high) / 2
+        if remaining(middle) > accuracy:
+            low = middle
+        else:
+            high = middle
+
+    wait = high * time_constant
+    if synchronous and detection_frequency and detection_frequency < SYNCHRONOUS_FILTER_MAX_FREQUENCY:
+        wait += 1 / detection_frequency
+    return wait
+
+
+class SettlingScheduler(object):
+    """
+    Decides how long to wait after a change (field, frequency, sensitivity, ...) before the
+    SR830 output can be read, from its filter settings.
+
+    The filter settings are read once and cached. Call `refresh` after changing the time
+    constant, the slope, the synchronous filter, the frequency or the harmonic.
+    """
+
+    def __init__(self, lockin, accuracy=1e-3, should_stop=None):
+        self.lockin = lockin
+        self.accuracy = accuracy
+        self.waiter = CancellableWait(should_stop)
+        self.refresh()
+
+    def refresh(self):
+        self.time_constant = self.lockin.time_constant
+        self.filter_slope = self.lockin.filter_slope
+        self.synchronous = self.lockin.filter_synchronous
+        self.frequency = self.lockin.frequency
+        self.harmonic = int(self.lockin.harmonic)
+
+    def settling_time(self, accuracy=None):
+        """Wait needed after a change to reach `accuracy`, defaulting to the scheduler accuracy."""
+        return settling_time(
+            self.time_constant,
+            self.filter_slope,
+            self.accuracy if accuracy is None else accuracy,
+            self.synchronous,
+            self.frequency * self.harmonic,
+        )
+
+    def wait(self, since=None, accuracy=None):
+        """
+        Waits until the output has settled.
+
+        Args:
+            since (float): `perf_counter()` time of the change. Time already spent since then,
+                e.g. reading other instruments, is not waited again. Defaults to now.
+            accuracy (float): Relative accuracy to settle to.
+
+        Returns:
+            bool: True once settled, False if the scheduler's `should_stop()` became True first.
+        """
+        if since is None:
+            since = perf_counter()
+        return self.waiter.until(since + self.settling_time(accuracy))
+
+
+class SensitivityTracker(object):
+    """
+    Keeps the SR830 sensitivity matched to a slowly varying signal during a sweep.
+
+    The magnitude expected at the next point is extrapolated from the last readings, and
+    the range is raised before the signal reaches full scale. It is only lowered once the
+    recent readings fit with twice the usual headroom, so the range does not toggle
+    between two settings on a noisy signal. Overloads fall back to `SR830.auto_range`.
+
+    The sensitivity index is tracked locally, so no query is needed at points where the
+    range does not change.
+    """
+
+    def __init__(self, lockin, headroom=1.25, history=3, scheduler=None):
+        self.lockin = lockin
+        self.headroom = headroom
+        self.scheduler = scheduler
+        self.readings = deque(maxlen=history)
+        self.input_scale = lockin.input_scale
+        self.index = int(lockin.ask("SENS?"))
+
+    @property
+    def sensitivity(self):
+        return self.lockin.SENSITIVITIES[self.index]
+
+    def apply(self):
+        """Writes the tracked sensitivity to the lock-in, e.g. after it was changed for another harmonic."""
+        self.lockin.write("SENS%d" % self.index)
+
+    def predict(self):
+        """Magnitude expected at the next point, by linear extrapolation of the last two readings."""
+        if len(self.readings) < 2:
+            return self.readings[-1]
+        return max(2 * self.readings[-1] - self.readings[-2], 0)
+
+    def update(self, magnitude, overloaded=False):
+        """
+        Adds the magnitude measured at the current point, and changes the range if the next
+        point is expected to overload or to use only a small part of it.
+
+        Args:
+            magnitude (float): Magnitude (R) measured at the current point.
+            overloaded (bool): Whether the lock-in reported an overload at this point.
+
+        Returns:
+            bool: True if the sensitivity was changed, in which case the caller has to
+            wait for the output to settle before the next reading.
+        """
+        if overloaded:
+            self.readings.clear()
+            settle_time = self.scheduler.settling_time() if self.scheduler else None
+            self.lockin.auto_range(self.headroom, settle_time, self.scheduler.waiter if self.scheduler else None)
+            self.index = int(self.lockin.ask("SENS?"))
+            return True
+
+        self.readings.append(abs(magnitude))
+        predicted = self.predict()
+
+        index = self.lockin.sensitivity_index(predicted, self.headroom, self.input_scale)
+        if index < self.index:
+            # Only go down if the recent readings fit in the lower range with double headroom
+            largest = max(max(self.readings), predicted)
+            index = min(max(index, self.lockin.sensitivity_index(largest, 2 * self.headroom, self.input_scale)), self.index)
+
+        if index == self.index:
+            return False
+
+        self.lockin.write("SENS%d" % index)
+        self.index = index
+        return True
+
+
+class PhaseCache(object):
+    """
+    Reference phases found by auto-phase, per sample, harmonic and frequency, so later sweeps
+    can set the phase directly instead of running auto-phase at every point.
+    """
+
+    def __init__(self, path=PHASE_CACHE_FILE):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.phases = json.load(f)
+        except (OSError, ValueError):
+            self.phases = {}
+
+    @staticmethod
+    def key(sample_name, frequency, harmonic=1):
+        return f"{sample_name}|{int(harmonic)}|{frequency:.6g}"
+
+    def get(self, sample_name, frequency, harmonic=1):
+        """Returns the cached phase in degrees, or None if this frequency was never auto-phased."""
+        return self.phases.get(self.key(sample_name, frequency, harmonic))
+
+    def set(self, sample_name, frequency, phase, harmonic=1):
+        self.phases[self.key(sample_name, frequency, harmonic)] = phase
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.phases, f, indent=4)
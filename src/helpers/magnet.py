@@ -0,0 +1,248 @@
+from time import perf_counter
+import logging
+
+from helpers.runtime_estimator import format_duration
+from helpers.wait import CancellableWait
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Field readings closer than this to the target count as reached (T)
+FIELD_TOLERANCE = 4e-4
+
+# Number of ramp segments of the LS625
+NUM_RAMP_SEGMENTS = 5
+
+
+class RampProfile(object):
+    """
+    Ramp rate as a function of the output current magnitude, as programmed into the LS625
+    ramp segments. Each segment is (upper current, rate), in increasing current order, and
+    `base_rate` applies above the last one.
+    """
+
+    def __init__(self, segments, base_rate):
+        self.segments = list(segments)
+        self.base_rate = base_rate
+
+    @classmethod
+    def plan(cls, max_current, fast_rate, slow_rate, num_segments=NUM_RAMP_SEGMENTS):
+        """
+        Plans segments that go from `fast_rate` at zero current to `slow_rate` at `max_current`,
+        decreasing linearly. Each segment uses the rate allowed at its upper end, so the rate
+        never exceeds that envelope.
+
+        Args:
+            max_current (float): Current limit of the magnet (A).
+            fast_rate (float): Ramp rate allowed at zero current (A/s).
+            slow_rate (float): Ramp rate allowed at the current limit (A/s).
+            num_segments (int): Number of segments to use.
+        """
+        segments = []
+        for i in range(1, num_segments + 1):
+            fraction = i / num_segments
+            rate = fast_rate + (slow_rate - fast_rate) * fraction
+            segments.append((round(max_current * fraction, 4), round(rate, 4)))
+        return cls(segments, slow_rate)
+
+    def program(self, magnet):
+        """Writes the segments to the supply and enables them, within the rate limit of the supply."""
+        _, max_rate = magnet.get_limits()
+        self.segments = [(current, min(rate, max_rate)) for current, rate in self.segments]
+        self.base_rate = min(self.base_rate, max_rate)
+
+        for i, (current, rate) in enumerate(self.segments, start=1):
+            magnet.set_ramp_segment(i, current, rate)
+        magnet.set_ramp_rate(self.base_rate)
+        magnet.set_ramp_segments_enable(True)
+
+    def ramp_time(self, start, stop):
+        """
+        Time to ramp the output current from `start` to `stop` (A), through every segment on the way.
+        """
+        if start * stop < 0:
+            return self.ramp_time(start, 0) + self.ramp_time(0, stop)
+
+        low, high = sorted((abs(start), abs(stop)))
+        seconds = 0
+        lower = 0
+        for upper, rate in self.segments:
+            overlap = min(high, upper) - max(low, lower)
+            if overlap > 0:
+                seconds += overlap / rate
+            lower = upper
+        if high > lower:
+            seconds += (high - max(low, lower)) / self.base_rate
+        return seconds
+
+
+def plan_ramp(ramp_rate, use_segments=False, fast_rate=None, max_current=None):
+    """
+    Returns what the ramp of a procedure is predicted with: the single `ramp_rate`, or
+    ramp segments from `fast_rate` at zero current down to `ramp_rate` at `max_current`.
+    """
+    if use_segments:
+        return RampProfile.plan(max_current, fast_rate, ramp_rate)
+    return ramp_rate
+
+
+def configure_ramp(magnet, ramp):
+    """
+    Sets up the supply for a ramp from `plan_ramp`.
+    """
+    if isinstance(ramp, RampProfile):
+        ramp.program(magnet)
+    else:
+        magnet.set_ramp_segments_enable(False)
+        magnet.set_ramp_rate(ramp)
+
+
+def ramp_time(start, stop, current_field_constant, ramp_rate):
+    """
+    Time the magnet supply takes to ramp between two fields.
+
+    Args:
+        start (float): Field at the start of the ramp (T).
+        stop (float): Field at the end of the ramp (T).
+        current_field_constant (float): Current per field of the magnet (A/T).
+        ramp_rate (float or RampProfile): Current ramp rate (A/s), or the ramp segments in use.
+
+    Returns:
+        float: The ramp time (s).
+    """
+    if isinstance(ramp_rate, RampProfile):
+        return ramp_rate.ramp_time(start * current_field_constant, stop * current_field_constant)
+    return abs(stop - start) * current_field_constant / ramp_rate
+
+
+def ramp_to_field(magnet, target, current_field_constant, ramp_rate, should_stop=lambda: False, origin=None,
+                  tolerance=FIELD_TOLERANCE, poll_interval=0.1):
+    """
+    Ramps the magnet to `target` in one continuous move, with a single SETF, and waits until
+    the field is reached. The wait can be interrupted with `should_stop`, in which case the
+    supply keeps ramping to the target.
+
+    Args:
+        magnet (ElectromagnetPowerSupply): The magnet supply.
+        target (float): Field to ramp to (T).
+        current_field_constant (float): Current per field of the magnet (A/T).
+        ramp_rate (float or RampProfile): Current ramp rate set on the supply (A/s), or its ramp segments.
+        should_stop (function): Returns True to give up waiting.
+        origin (float): Field the ramp starts from (T), read from the supply if not given.
+        tolerance (float): Allowed difference from the target (T).
+        poll_interval (float): Interval of the read-back once the ramp should be over (s).
+
+    Returns:
+        bool: True once the field is reached, False if `should_stop()` became True first.
+    """
+    if origin is None:
+        origin = magnet.measured_magnetic_field()
+
+    magnet.set_magnetic_field(target)
+    expected = ramp_time(origin, target, current_field_constant, ramp_rate)
+    return wait_for_field(magnet, target, expected, should_stop, tolerance, poll_interval)
+
+
+def ramp_down(magnet, current_field_constant, ramp, report=None, poll_interval=0.5, timeout=10):
+    """
+    Abort path: stops the ramp in progress and sends the field to zero in one move, at the
+    given ramp. Returns as soon as the field is seen to descend, not once it reaches zero,
+    so the caller is not blocked for the whole ramp.
+
+    An abort usually follows a stop request, so the procedure's `should_stop` is already True
+    here; the descent check is only bounded by `timeout`.
+
+    Args:
+        magnet (ElectromagnetPowerSupply): The magnet supply.
+        current_field_constant (float): Current per field of the magnet (A/T).
+        ramp (float or RampProfile): Ramp rate (A/s), or ramp segments.
+        report (function): Called with (field, seconds to zero) at every read-back.
+        poll_interval (float): Interval of the field read-back (s).
+        timeout (float): Longest wait for the field to start descending (s).
+
+    Returns:
+        float: Predicted time until the field is at zero (s).
+
+    Raises:
+        TimeoutError: If the field does not start descending within `timeout`.
+    """
+    magnet.stop_output_current_ramp()
+    start = magnet.measured_magnetic_field()
+    configure_ramp(magnet, ramp)
+    magnet.set_magnetic_field(0)
+
+    waiter = CancellableWait()
+    field = start
+    deadline = perf_counter() + timeout
+    while abs(field) > FIELD_TOLERANCE:
+        remaining = ramp_time(field, 0, current_field_constant, ramp)
+        if report is not None:
+            report(field, remaining)
+        if abs(field) < abs(start) - FIELD_TOLERANCE:
+            return remaining
+        if perf_counter() > deadline:
+            raise TimeoutError(f"Field is not descending from {start} T after {timeout} s.")
+        waiter.sleep(poll_interval)
+        field = magnet.measured_magnetic_field()
+
+    if report is not None:
+        report(field, 0)
+    return 0
+
+
+def abort_ramp(magnet, current_field_constant, ramp, timeout=10):
+    """
+    Sends the field back to zero with `ramp_down`, at the ramp the procedure was using, and
+    logs its progress. A field that is slow to start descending is logged rather than raised,
+    so the caller can go on to shut down the outputs.
+
+    Args:
+        magnet (ElectromagnetPowerSupply): The magnet supply.
+        current_field_constant (float): Current per field of the magnet (A/T).
+        ramp (float or RampProfile): Ramp of the procedure, from `plan_ramp`.
+        timeout (float): Longest wait for the field to start descending (s).
+    """
+    def report(field, remaining):
+        log.info(f"Ramping field down: {field:.4f} T, {format_duration(remaining)} to zero.")
+
+    try:
+        ramp_down(magnet, current_field_constant, ramp, report, timeout=timeout)
+    except TimeoutError as e:
+        log.warning(e)
+
+
+def wait_for_field(magnet, target, expected, should_stop=lambda: False, tolerance=FIELD_TOLERANCE, poll_interval=0.1, timeout=None):
+    """
+    Waits for a ramp to `target` that is already under way.
+
+    The magnet is left alone for the `expected` ramp time, after which the field is read
+    back until it is within `tolerance` of the target. The LS625 does not signal the end
+    of a ramp, so the read-back is the only completion check.
+
+    Args:
+        magnet (ElectromagnetPowerSupply): The magnet supply.
+        target (float): Field being ramped to (T).
+        expected (float): Predicted ramp time (s).
+        should_stop (function): Returns True to give up waiting.
+        tolerance (float): Allowed difference from the target (T).
+        poll_interval (float): Interval of the read-back once the ramp should be over (s).
+        timeout (float): Longest wait past the expected time (s), defaults to the expected time + 10 s.
+
+    Returns:
+        bool: True once the field is reached, False if `should_stop()` became True first.
+    """
+    waiter = CancellableWait(should_stop)
+    start = perf_counter()
+    end = start + expected
+    deadline = end + (expected + 10 if timeout is None else timeout)
+
+    if not waiter.until(end):
+        return False
+
+    while abs(magnet.measured_magnetic_field() - target) > tolerance:
+        if perf_counter() > deadline:
+            raise TimeoutError(f"Field did not reach {target} T within {perf_counter() - start:.0f} s.")
+        if not waiter.sleep(poll_interval):
+            return False
+
+    return True
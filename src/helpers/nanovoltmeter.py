@@ -0,0 +1,86 @@
+from bisect import bisect_left
+from collections import deque
+import logging
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Full-scale voltage ranges of the 2182 channels
+CHANNEL_RANGES = {
+    1: [10e-3, 100e-3, 1, 10, 100],
+    2: [100e-3, 1, 10],
+}
+
+# The 2182 returns +9.9E37 for a reading over the range
+OVERFLOW = 9.9e37
+
+
+class VoltageRangeTracker(object):
+    """
+    Keeps a fixed 2182 voltage range matched to the signal during a sweep, so auto-range
+    does not add extra conversions at unpredictable points.
+
+    The voltage expected at the next point is extrapolated from the last readings, and the
+    range is raised before the reading gets close to full scale. It is only lowered once the
+    recent readings fit with twice the usual headroom, so the range does not toggle between
+    two settings on a noisy signal. Overflowed readings fall back to auto-range until the
+    next valid reading.
+    """
+
+    def __init__(self, channel, headroom=1.1, history=3):
+        self.channel = channel
+        self.headroom = headroom
+        self.ranges = CHANNEL_RANGES[channel.id]
+        self.readings = deque(maxlen=history)
+        self.index = None
+
+    @property
+    def range(self):
+        return None if self.index is None else self.ranges[self.index]
+
+    @staticmethod
+    def overflowed(*readings):
+        return any(abs(reading) >= OVERFLOW for reading in readings)
+
+    def range_index(self, voltage, headroom):
+        return min(bisect_left(self.ranges, abs(voltage) * headroom), len(self.ranges) - 1)
+
+    def predict(self):
+        """Voltage magnitude expected at the next point, by linear extrapolation of the last two readings."""
+        if len(self.readings) < 2:
+            return self.readings[-1]
+        return max(2 * self.readings[-1] - self.readings[-2], 0)
+
+    def fall_back(self):
+        """Enables auto-range after an overflow, the reading has to be repeated."""
+        log.info("2182 overflow, falling back to auto-range.")
+        self.readings.clear()
+        self.channel.voltage_range_auto_enabled = True
+        self.index = None
+
+    def update(self, voltage):
+        """
+        Adds the voltage measured at the current point, and fixes the range for the next one.
+
+        Args:
+            voltage (float): Largest voltage magnitude measured at the current point.
+
+        Returns:
+            bool: True if the range was changed.
+        """
+        self.readings.append(abs(voltage))
+        predicted = self.predict()
+
+        index = self.range_index(predicted, self.headroom)
+        if self.index is not None and index < self.index:
+            # Only go down if the recent readings fit in the lower range with double headroom
+            largest = max(max(self.readings), predicted)
+            index = min(max(index, self.range_index(largest, 2 * self.headroom)), self.index)
+
+        if index == self.index:
+            return False
+
+        # Setting a range also disables auto-range
+        self.channel.voltage_range = self.ranges[index]
+        self.index = index
+        return True
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from helpers.common import DATA_DIRECTORY
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+PID_PROFILE_FILE = os.path.join(DATA_DIRECTORY, "pid_profiles.json")
+
+# Setting ranges of the Model336 control loop
+P_LIMITS = (0.1, 1000)
+I_LIMITS = (0.1, 1000)
+
+# Model336.HeaterRange names a profile can select
+HEATER_RANGES = ("LOW", "MEDIUM", "HIGH")
+
+
+def fit_fopdt(times, temperatures, step, tail=0.1):
+    """
+    Fits a first order plus dead time model to an open loop step response, with the two-point
+    method: the time constant and dead time follow from the times at which the response reaches
+    28.3 % and 63.2 % of its final change.
+
+    Args:
+        times (list): Sample times (s), starting at the step.
+        temperatures (list): Stage temperature at each sample (K).
+        step (float): Size of the heater output step (% of the range).
+        tail (float): Fraction of the samples at the end averaged for the final temperature.
+
+    Returns:
+        tuple: (gain (K/%), time constant (s), dead time (s)).
+
+    Raises:
+        ValueError: If the response does not rise, e.g. the step was too small.
+    """
+    times = np.asarray(times, dtype=float) - times[0]
+    temperatures = np.asarray(temperatures, dtype=float)
+
+    count = max(int(len(temperatures) * tail), 1)
+    initial = temperatures[0]
+    final = np.mean(temperatures[-count:])
+    change = final - initial
+    if step <= 0 or change <= 0:
+        raise ValueError(f"No rise in the step response ({change:.3g} K for a {step} % step).")
+
+    response = (temperatures - initial) / change
+    t28 = times[np.argmax(response >= 0.283)]
+    t63 = times[np.argmax(response >= 0.632)]
+    time_constant = 1.5 * (t63 - t28)
+    dead_time = max(t63 - time_constant, 0)
+
+    if len(temperatures) >= 2 * count and final - np.mean(temperatures[-2 * count:-count]) > 0.05 * change:
+        log.warning("Step response still rising at the end of the recording, the fit underestimates the gain.")
+
+    return float(change / step), float(time_constant), float(dead_time)
+
+
+def tune_pid(gain, time_constant, dead_time, closed_loop_time=None):
+    """
+    PI settings of the Model336 for a first order plus dead time stage, with the SIMC rules.
+    Thermal stages are slow and noisy, so no derivative term is used.
+
+    The Model336 P is the heater output (%) per kelvin of error, I is 1000 / integral time (s).
+
+    Args:
+        gain (float): Process gain (K/%).
+        time_constant (float): Process time constant (s).
+        dead_time (float): Process dead time (s).
+        closed_loop_time (float): Desired closed loop time constant (s), defaults to the dead
+            time, but at least a tenth of the time constant.
+
+    Returns:
+        tuple: (P, I, D).
+    """
+    if closed_loop_time is None:
+        closed_loop_time = max(dead_time, 0.1 * time_constant)
+
+    p = time_constant / (gain * (closed_loop_time + dead_time))
+    integral_time = min(time_constant, 4 * (closed_loop_time + dead_time))
+    i = 1000 / integral_time
+    return round(float(np.clip(p, *P_LIMITS)), 1), round(float(np.clip(i, *I_LIMITS)), 1), 0
+
+
+class PidProfile(object):
+    """
+    PID settings and heater range fitted for the set temperatures from `low` up to `high` (K),
+    along with the step response model they were tuned from.
+    """
+
+    def __init__(self, low, high, heater_range, p, i, d, gain=None, time_constant=None, dead_time=None):
+        self.low = low
+        self.high = high
+        self.heater_range = heater_range
+        self.p = p
+        self.i = i
+        self.d = d
+        self.gain = gain
+        self.time_constant = time_constant
+        self.dead_time = dead_time
+
+    def __repr__(self):
+        return f"PidProfile({self.low}-{self.high} K, range {self.heater_range}, PID {self.p}, {self.i}, {self.d})"
+
+    @property
+    def pid(self):
+        return self.p, self.i, self.d
+
+    def contains(self, temperature):
+        return self.low <= temperature < self.high
+
+    def validate(self):
+        """
+        Checks a profile read from a file and converts its numbers to floats.
+
+        Raises:
+            ValueError: If the band or the PID settings are not numbers, the PID settings are
+                negative or not finite, or the heater range is not a Model336 range.
+        """
+        self.low, self.high = float(self.low), float(self.high)
+        if self.heater_range not in HEATER_RANGES:
+            raise ValueError(f"Unknown heater range {self.heater_range!r}, expected one of {HEATER_RANGES}.")
+        self.p, self.i, self.d = (float(value) for value in self.pid)
+        if not all(np.isfinite(value) and value >= 0 for value in self.pid):
+            raise ValueError(f"PID settings {self.pid} must be finite and non-negative.")
+
+    @classmethod
+    def from_step_response(cls, low, high, heater_range, times, temperatures, step):
+        gain, time_constant, dead_time = fit_fopdt(times, temperatures, step)
+        return cls(low, high, heater_range, *tune_pid(gain, time_constant, dead_time), gain, time_constant, dead_time)
+
+
+class PidProfiles(object):
+    """
+    The calibrated PID profiles of the setup, one per temperature band.
+    """
+
+    def __init__(self, profiles=None):
+        self.profiles = sorted(profiles or [], key=lambda profile: profile.low)
+
+    @classmethod
+    def load(cls, path=PID_PROFILE_FILE):
+        """Loads the stored profiles, skipping entries that are incomplete or malformed."""
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        if not isinstance(entries, list):
+            log.warning(f"Ignoring {path}, it does not hold a list of PID profiles.")
+            return cls()
+
+        profiles = []
+        for entry in entries:
+            try:
+                profile = PidProfile(**entry)
+                profile.validate()
+            except (KeyError, TypeError, ValueError) as e:
+                log.warning(f"Skipping malformed PID profile {entry!r} in {path}: {e}")
+                continue
+            profiles.append(profile)
+        return cls(profiles)
+
+    def save(self, path=PID_PROFILE_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump([vars(profile) for profile in self.profiles], f, indent=4)
+
+    def update(self, profile):
+        """Adds `profile`, replacing the profile of the same band."""
+        self.profiles = [p for p in self.profiles if (p.low, p.high) != (profile.low, profile.high)]
+        self.profiles.append(profile)
+        self.profiles.sort(key=lambda p: p.low)
+
+    def select(self, temperature):
+        """
+        Profile for `temperature`: the band containing it, or the nearest band outside the
+        calibrated range. None if nothing is calibrated yet.
+        """
+        for profile in self.profiles:
+            if profile.contains(temperature):
+                return profile
+        if not self.profiles:
+            return None
+        return min(self.profiles, key=lambda p: min(abs(temperature - p.low), abs(temperature - p.high)))
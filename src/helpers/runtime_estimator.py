@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from time import perf_counter
+import json
+import os
+
+from helpers.common import DATA_DIRECTORY
+
+LATENCY_FILE = os.path.join(DATA_DIRECTORY, "command_latencies.json")
+
+
+class CommandLatencies(object):
+    """
+    Running mean of the wall-clock time taken by each bus command a sweep issues, in seconds.
+
+    The defaults are rough values for our GPIB setup and are replaced by the values measured
+    during previous runs once a latency file exists.
+    """
+
+    DEFAULTS = {
+        "set_field": 0.01,          # SETF
+        "read_field": 0.02,         # RDGF?
+        "read_voltage": 0.03,       # 2182 :READ? overhead on top of the integration time
+        "read_delta": 0.1,          # 6221 delta run overhead (arm, buffer polling, TRAC:DATA?)
+        "reverse_current": 0.01,    # Yokogawa SOUR:LEV write for a polarity reversal
+        "emit": 0.002,              # emitting results to the GUI and the results file
+    }
+    DEFAULT_LINE_FREQUENCY = 60
+
+    def __init__(self, latencies=None, counts=None, line_frequency=DEFAULT_LINE_FREQUENCY):
+        self.latencies = dict(self.DEFAULTS)
+        self.latencies.update(latencies or {})
+        self.counts = dict(counts or {})
+        self.line_frequency = line_frequency
+
+    def get(self, command):
+        return self.latencies.get(command, 0)
+
+    def record(self, command, seconds):
+        """Adds a new measurement of `command` to its running mean."""
+        count = self.counts.get(command, 0)
+        if count == 0:
+            self.latencies[command] = seconds
+        else:
+            self.latencies[command] += (seconds - self.latencies[command]) / (count + 1)
+        self.counts[command] = count + 1
+
+    @contextmanager
+    def timed(self, command, offset=0):
+        """
+        Records the time spent in the `with` block as one execution of `command`.
+
+        Args:
+            command (str): Name of the command being timed.
+            offset (float): Known part of the duration (e.g. an integration time) that
+                is not counted as latency.
+        """
+        start = perf_counter()
+        yield
+        self.record(command, max(perf_counter() - start - offset, 0))
+
+    def integration_time(self, num_plc):
+        """Integration time of one reading at `num_plc` power line cycles, in seconds."""
+        return num_plc / self.line_frequency
+
+    @classmethod
+    def load(cls, path=LATENCY_FILE):
+        """Loads the latencies measured in previous runs, falling back to the defaults."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+
+        return cls(
+            data.get("latencies"),
+            data.get("counts"),
+            data.get("line_frequency", cls.DEFAULT_LINE_FREQUENCY),
+        )
+
+    def save(self, path=LATENCY_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {"latencies": self.latencies, "counts": self.counts, "line_frequency": self.line_frequency},
+                f,
+                indent=4,
+            )
+
+
+def estimate_field_sweep(plan, current_field_constant, magnet_ramp_rate, num_plc,
+                         latencies=None, stabilization_time=10, readout_time=None):
+    """
+    Predicts how long a field sweep takes, phase by phase.
+
+    A passover is a single ramp to its end field, plus a SETF and the RDGF? completion check.
+    Every measured point costs a SETF, the ramp from the previous point, a RDGF? query and the
+    sample readout. Emitting a point overlaps the ramp to the next one, so it only adds time
+    where it takes longer than the ramps. Ramps are timed through the ramp segments when they are used.
+    The time needed to reach the set temperature depends on the cryostat state and is not
+    included.
+
+    Args:
+        plan (SweepPlan): The sweep to estimate.
+        current_field_constant (float): Conversion from field to magnet current (A/T).
+        magnet_ramp_rate (float or RampProfile): Magnet current ramp rate (A/s), or the ramp segments in use.
+        num_plc (float): Integration time of the 2182 in power line cycles.
+        latencies (CommandLatencies): Measured command latencies, defaults to the stored ones.
+        stabilization_time (float): Fixed wait after the set temperature is reached (s).
+        readout_time (float): Time taken to measure the sample at one point (s), defaults
+            to a single 2182 reading.
+
+    Returns:
+        list: (phase, seconds) tuples in execution order, ending with the total.
+    """
+    if latencies is None:
+        latencies = CommandLatencies.load()
+
+    if readout_time is None:
+        readout_time = latencies.get("read_voltage") + latencies.integration_time(num_plc)
+    measured_point = latencies.get("set_field") + latencies.get("read_field") + readout_time
+
+    durations = plan.ramp_durations(current_field_constant, magnet_ramp_rate)
+    passover_overhead = latencies.get("set_field") + latencies.get("read_field")
+    lead_in = durations[:len(plan.lead_in)]
+    lead_out = durations[len(durations) - len(plan.lead_out):]
+    measured_ramps = sum(seconds for _, measured, seconds in durations if measured)
+
+    phases = [("Temperature stabilization", stabilization_time)]
+    phases.append(("Lead-in passover", sum(seconds + passover_overhead for _, _, seconds in lead_in)))
+    emit_excess = max(len(plan) * latencies.get("emit") - measured_ramps, 0)
+    phases.append(("Measurement", measured_ramps + len(plan) * measured_point + emit_excess))
+    phases.append(("Lead-out passover", sum(seconds + passover_overhead for _, _, seconds in lead_out)))
+    phases.append(("Total", sum(seconds for _, seconds in phases)))
+
+    return phases
+
+
+def format_duration(seconds):
+    """Formats a duration in seconds as H:MM:SS."""
+    return str(timedelta(seconds=round(seconds)))
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from time import perf_counter
+import logging
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class StartupGraph(object):
+    """
+    Runs the startup steps of a procedure as a dependency graph: every step starts on its own
+    thread as soon as the steps it depends on are done, so instruments are configured while
+    e.g. the temperature is still stabilizing.
+
+    Steps that talk to the same instrument have to depend on each other, steps on different
+    instruments can share the GPIB bus since VISA serializes the transfers.
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.failed = Event()
+
+    def add(self, name, function, *dependencies):
+        """
+        Adds a step. Its dependencies have to be added first, which also rules out cycles.
+
+        Args:
+            name (str): Name of the step, used for the dependencies and in the log.
+            function (function): Called without arguments to run the step.
+            dependencies (str): Names of the steps that have to be done before this one.
+        """
+        for dependency in dependencies:
+            if dependency not in self.steps:
+                raise ValueError(f"Startup step '{name}' depends on unknown step '{dependency}'.")
+        self.steps[name] = (function, dependencies)
+
+    def should_stop(self, should_stop=lambda: False):
+        """Returns a `should_stop` for long steps that also gives up once another step failed."""
+        return lambda: self.failed.is_set() or should_stop()
+
+    def run(self):
+        """
+        Runs every step and waits for all of them.
+
+        Returns:
+            dict: Return value of each step, by name.
+
+        Raises:
+            Exception: The first error raised by a step. Steps depending on it are not run.
+        """
+        futures = {}
+
+        def run_step(name, function, dependencies):
+            for dependency in dependencies:
+                futures[dependency].result()
+            start = perf_counter()
+            try:
+                result = function()
+            except Exception:
+                self.failed.set()
+                raise
+            log.info(f"Startup step '{name}' done in {perf_counter() - start:.1f} s.")
+            return result
+
+        # One thread per step, a step waiting for its dependencies never holds up another one
+        with ThreadPoolExecutor(max_workers=max(len(self.steps), 1), thread_name_prefix="startup") as executor:
+            for name, (function, dependencies) in self.steps.items():
+                futures[name] = executor.submit(run_step, name, function, dependencies)
+
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,341 @@
+from collections import deque
+
+from enums.sweep_type import SweepType
+from helpers.magnet import ramp_time
+
+
+class SweepSegment(object):
+    """
+    A lazily evaluated, evenly spaced run of setpoints from `start` to `stop`.
+
+    The points are computed on demand, so a segment only stores its end points,
+    its length and its label, regardless of how fine the step is. The spacing
+    matches `np_linear`, i.e. the number of points is round(|stop - start| / step) + 1
+    and the last point is exactly `stop`.
+    """
+
+    def __init__(self, start, stop, step, label="", measured=True, skip_first=False):
+        if step == 0:
+            raise ValueError("Step value must be non-zero.")
+
+        num_points = abs(int(round((stop - start) / step))) + 1
+
+        self.start = start
+        self.stop = stop
+        self.step = abs(step)
+        self.label = label
+        self.measured = measured
+        self._num_points = num_points
+        # A one-point segment that repeats the previous stop is left empty
+        self._first = 1 if skip_first else 0
+        self._delta = (stop - start) / (num_points - 1) if num_points > 1 else 0
+
+    def __len__(self):
+        return self._num_points - self._first
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Sweep segment index out of range.")
+
+        index += self._first
+        if index == self._num_points - 1:
+            return self.stop
+        return self.start + index * self._delta
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"SweepSegment({self.label!r}, {self.first} -> {self.stop}, {len(self)} points)"
+
+    @property
+    def first(self):
+        """The first setpoint that is actually visited in this segment, its stop if it is empty."""
+        return self[0] if len(self) else self.stop
+
+    @property
+    def direction(self):
+        """1 if the segment ramps the field up, -1 if it ramps it down."""
+        return 1 if self.stop >= self.start else -1
+
+    def without_first(self):
+        """Returns a copy of this segment that skips its first point."""
+        return SweepSegment(self.start, self.stop, self.step, self.label, self.measured, skip_first=True)
+
+    def mirrored(self):
+        """Returns a copy of this segment with the sign of the field reversed."""
+        return SweepSegment(-self.start, -self.stop, self.step, self.label, self.measured, skip_first=bool(self._first))
+
+    def ramp_distance(self, origin):
+        """
+        Total field travelled while walking this segment, starting from `origin`.
+
+        Args:
+            origin (float): Field at which the magnet sits before the segment starts.
+        """
+        return abs(self.first - origin) + abs(self.stop - self.first)
+
+    def ramp_duration(self, origin, current_field_constant, ramp_rate):
+        """
+        Time spent ramping the magnet through this segment, starting from `origin`.
+
+        Args:
+            origin (float): Field at which the magnet sits before the segment starts (T).
+            current_field_constant (float): Conversion from field to magnet current (A/T).
+            ramp_rate (float or RampProfile): Magnet current ramp rate (A/s), or the ramp segments in use.
+
+        Returns:
+            float: Ramp duration in seconds.
+        """
+        return (
+            ramp_time(origin, self.first, current_field_constant, ramp_rate)
+            + ramp_time(self.first, self.stop, current_field_constant, ramp_rate)
+        )
+
+
+class SweepPlan(object):
+    """
+    An ordered list of sweep segments, some of which are measured and some of
+    which are passovers used to bring the field to the start point, or back to
+    the final point, without recording data.
+
+    Iterating over a plan yields the measured points lazily, in order, while
+    `len(plan)` is the total number of measured points.
+    """
+
+    def __init__(self, segments, origin=0):
+        self.segments = list(segments)
+        self.origin = origin
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.measured)
+
+    def __iter__(self):
+        return self.points()
+
+    def __repr__(self):
+        return f"SweepPlan({self.segments!r})"
+
+    @classmethod
+    def hysteresis(cls, low, high, step, sweep_type=SweepType.B1):
+        """
+        Builds the plan for a hysteresis loop between `low` and `high`.
+
+        Args:
+            low (float): Lowest setpoint of the loop.
+            high (float): Highest setpoint of the loop.
+            step (float): Spacing between setpoints.
+            sweep_type (SweepType): Shape of the loop (see `SweepType`).
+        """
+        sweep_type = SweepType(sweep_type)
+        step = abs(step)
+
+        up = SweepSegment(0, high, step, "up")
+        down = SweepSegment(high - step, low, step, "down")
+        up2 = SweepSegment(low + step, high, step, "up2")
+        down2 = SweepSegment(high - step, 0, step, "down2", measured=False)
+
+        if sweep_type == SweepType.B1:
+            segments = [up, down, SweepSegment(low + step, 0, step, "up2")]
+        elif sweep_type == SweepType.B2:
+            segments = [up, down, up2, down2]
+        elif sweep_type == SweepType.B3:
+            up.measured = False
+            segments = [up, down, up2, down2]
+
+        return cls(segments)
+
+    @classmethod
+    def tabular(cls, start_values, end_values, step_values):
+        """
+        Builds a fully measured plan from a table of (start, end, step) rows.
+        Repeated points at the boundary between two consecutive rows are only visited once,
+        also when a row is a single point:
+
+        >>> list(SweepPlan.tabular([0, 0.2], [0.2, 0.2], [0.1, 0.1]))
+        [0.0, 0.1, 0.2]
+        """
+        if len(start_values) != len(end_values) or len(start_values) != len(step_values):
+            raise ValueError("Start values, end values, and step values must all have the same length.")
+
+        segments = []
+        for i in range(len(start_values)):
+            segment = SweepSegment(start_values[i], end_values[i], step_values[i], f"segment {i + 1}")
+            if segments and segment.first == segments[-1].stop:
+                segment = segment.without_first()
+            segments.append(segment)
+
+        return cls(segments)
+
+    @property
+    def measured(self):
+        """The segments in which data is recorded."""
+        return [segment for segment in self.segments if segment.measured]
+
+    @property
+    def lead_in(self):
+        """The passover segments that bring the field to the first measured point."""
+        segments = []
+        for segment in self.segments:
+            if segment.measured:
+                break
+            segments.append(segment)
+        return segments
+
+    @property
+    def lead_out(self):
+        """The passover segments that follow the last measured point."""
+        segments = []
+        for segment in reversed(self.segments):
+            if segment.measured:
+                break
+            segments.insert(0, segment)
+        return segments
+
+    @property
+    def start_field(self):
+        """Field the measurement starts from, once the lead-in is done."""
+        return self.lead_in[-1].stop if self.lead_in else self.origin
+
+    @property
+    def end_field(self):
+        """Field at the last measured point, before the lead-out."""
+        return self.measured[-1].stop
+
+    def mirrored(self):
+        """Returns the same sweep with the sign of the field reversed, i.e. run in the opposite direction."""
+        return SweepPlan([segment.mirrored() for segment in self.segments], -self.origin)
+
+    def without_passovers(self, lead_in=True, lead_out=True):
+        """
+        Returns the plan without its lead-in and/or lead-out passovers, e.g. for a run that starts
+        where the previous one ended. Without the lead-in, the plan starts from the field the
+        lead-in would have ended on.
+        """
+        measured = self.segments.index(self.measured[0])
+        last = self.segments.index(self.measured[-1])
+        first = measured if lead_in else 0
+        end = last + 1 if lead_out else len(self.segments)
+        return SweepPlan(self.segments[first:end], self.start_field if lead_in else self.origin)
+
+    @property
+    def branch_labels(self):
+        """Labels of the measured segments, in sweep order."""
+        return [segment.label for segment in self.measured]
+
+    def points(self, start=0):
+        """
+        Generator over the measured points of the plan.
+
+        Args:
+            start (int): Index of the first measured point to yield.
+        """
+        for _, field in self.labelled_points(start):
+            yield field
+
+    def adaptive_points(self, stepper):
+        """
+        Generator over the measured points, spaced by `stepper` from the response measured so far
+        instead of by the step of the segments. The caller has to `stepper.add()` each measurement
+        before the next point is requested.
+
+        The points only move in the direction of their segment, so the field history that a
+        hysteresis branch relies on is kept, and every segment still ends exactly on its stop field.
+        """
+        for segment in self.measured:
+            if not len(segment):
+                continue
+            stepper.reset()
+            field = segment.first
+            while True:
+                yield field
+                if field == segment.stop:
+                    break
+                field += segment.direction * stepper.next_step()
+                if segment.direction * (field - segment.stop) >= 0:
+                    field = segment.stop
+
+    def labelled_points(self, start=0):
+        """Generator of (branch label, setpoint) pairs over the measured points."""
+        for segment in self.measured:
+            if start >= len(segment):
+                start -= len(segment)
+                continue
+            for i in range(start, len(segment)):
+                yield segment.label, segment[i]
+            start = 0
+
+    def ramp_durations(self, current_field_constant, ramp_rate):
+        """
+        Exact ramp time of each segment, including the move from the end of the previous one.
+
+        Args:
+            current_field_constant (float): Conversion from field to magnet current (A/T).
+            ramp_rate (float or RampProfile): Magnet current ramp rate (A/s), or the ramp segments in use.
+
+        Returns:
+            list: (label, measured, seconds) for every segment, in sweep order.
+        """
+        durations = []
+        origin = self.origin
+        for segment in self.segments:
+            durations.append((
+                segment.label,
+                segment.measured,
+                segment.ramp_duration(origin, current_field_constant, ramp_rate),
+            ))
+            origin = segment.stop
+        return durations
+
+    def ramp_duration(self, current_field_constant, ramp_rate):
+        """Total ramp time of the whole plan in seconds."""
+        return sum(duration for _, _, duration in self.ramp_durations(current_field_constant, ramp_rate))
+
+
+class AdaptiveStepper(object):
+    """
+    Picks the next field step from the measured response, so that it changes by about
+    `target_change` from one point to the next. Steps shrink where the slope, or the change
+    of the slope, is large (e.g. at a switching field) and grow back towards `max_step`
+    on flat regions, at most by `growth` per point.
+    """
+
+    def __init__(self, min_step, max_step, target_change, growth=2):
+        self.min_step = abs(min_step)
+        self.max_step = abs(max_step)
+        self.target_change = abs(target_change)
+        self.growth = growth
+        self.reset()
+
+    def reset(self):
+        """Forgets the response, e.g. at the start of a new branch, and goes back to the coarse step."""
+        self.fields = deque(maxlen=3)
+        self.values = deque(maxlen=3)
+        self.step = self.max_step
+
+    def add(self, field, value):
+        self.fields.append(field)
+        self.values.append(value)
+
+    def slope(self, i):
+        """Slope between the points i - 1 and i, counted from the end (-1 is the last point)."""
+        df = self.fields[i] - self.fields[i - 1]
+        return (self.values[i] - self.values[i - 1]) / df if df else 0
+
+    def next_step(self):
+        if len(self.values) < 2:
+            return self.step
+
+        # Change expected over the next step from the slope, plus the slope change for curvature
+        slope = self.slope(-1)
+        change = abs(slope)
+        if len(self.values) == 3:
+            change += abs(slope - self.slope(-2))
+        change *= self.step
+
+        step = self.step * self.target_change / change if change > 0 else self.max_step
+        self.step = min(max(min(step, self.growth * self.step), self.min_step), self.max_step)
+        return self.step
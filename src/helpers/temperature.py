@@ -0,0 +1,186 @@
+from time import perf_counter
+import logging
+
+from helpers.common import HeaterSetting
+from helpers.pid_tuning import PidProfile, PidProfiles
+from helpers.wait import CancellableWait
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Heater output driving the sample stage, and the temperature inputs of the Model336
+SAMPLE_HEATER = 2
+SAMPLE_INPUT = 0
+MAGNET_INPUT = 1
+
+MAX_MAGNET_TEMPERATURE = 5.1
+
+# Temperature bands (K) calibrated by default, with the heater range used in each
+PID_BANDS = [
+    (3, 10, "LOW"),
+    (10, 30, "LOW"),
+    (30, 80, "MEDIUM"),
+    (80, 300, "HIGH"),
+]
+
+
+def configure_heater(tctrl, heater_setting, power_amp, set_temperature):
+    """
+    Configures the sample stage heater for closed loop control at `set_temperature`.
+
+    Args:
+        tctrl (Model336): The temperature controller.
+        heater_setting (HeaterSetting or str): PID and range setting of the heater. With
+            `HeaterSetting.AUTO`, the calibrated PID profile of the set temperature is used.
+        power_amp (float): Maximum heater current (A).
+        set_temperature (float): Setpoint (K).
+    """
+    heater_setting = HeaterSetting(heater_setting)
+    pid = HeaterSetting.pid(heater_setting)
+    heater_range = HeaterSetting.range(heater_setting)
+
+    if heater_setting == HeaterSetting.AUTO:
+        profile = PidProfiles.load().select(set_temperature)
+        if profile is None:
+            log.warning("No calibrated PID profile, using the low heater setting.")
+            pid, heater_range = HeaterSetting.pid(HeaterSetting.LOW), HeaterSetting.range(HeaterSetting.LOW)
+        else:
+            log.info(f"Using {profile} for {set_temperature} K.")
+            pid, heater_range = profile.pid, tctrl.HeaterRange[profile.heater_range]
+
+    tctrl.set_heater_pid(SAMPLE_HEATER, *pid)
+    # intended for low setting, may need to adjust for high
+    tctrl.set_heater_setup(
+        SAMPLE_HEATER,
+        tctrl.HeaterResistance.HEATER_25_OHM,
+        power_amp,
+        tctrl.HeaterOutputUnits.POWER,
+    )
+    # closed loop mode, CHANNEL_A for sample stage, True - Remains on after power cycle (?)
+    tctrl.set_heater_output_mode(
+        SAMPLE_HEATER,
+        tctrl.HeaterOutputMode.CLOSED_LOOP,
+        tctrl.InputChannel.CHANNEL_A,
+        True,
+    )
+    # setpoint to set temperature without ramping
+    tctrl.set_setpoint_ramp_parameter(SAMPLE_HEATER, False, 0)
+    tctrl.set_control_setpoint(SAMPLE_HEATER, set_temperature)
+    tctrl.set_heater_range(SAMPLE_HEATER, heater_range)
+
+
+def wait_for_temperature(tctrl, set_temperature, should_stop, tolerance=0.05, poll_interval=1):
+    """
+    Blocks until the sample stage is within `tolerance` of `set_temperature`.
+
+    Returns:
+        bool: True once the temperature is reached, False if `should_stop()` became True first.
+    """
+    waiter = CancellableWait(should_stop)
+    while True:
+        if waiter.cancelled():
+            log.warning("Catch stop command in procedure")
+            return False
+
+        temperature = tctrl.get_all_kelvin_reading()[SAMPLE_INPUT]
+        if abs(temperature - set_temperature) < tolerance:
+            log.info("Temperature reached.")
+            return True
+
+        log.info(f"Current temperature: {temperature}")
+        waiter.sleep(poll_interval)
+
+
+def sample_temperature(tctrl):
+    return tctrl.get_all_kelvin_reading()[SAMPLE_INPUT]
+
+
+def magnet_temperature(tctrl):
+    return tctrl.get_all_kelvin_reading()[MAGNET_INPUT]
+
+
+def record_step_response(tctrl, step, duration, should_stop=None, sample_interval=1):
+    """
+    Records the open loop response of the sample stage to a step of the heater output, starting
+    from the output that currently holds the stage at its setpoint.
+
+    Args:
+        tctrl (Model336): The temperature controller, stable in closed loop.
+        step (float): Heater output step (% of the range).
+        duration (float): Recording time (s), long enough for the stage to settle.
+        should_stop (function): Returns True to abandon the recording.
+        sample_interval (float): Time between temperature readings (s).
+
+    Returns:
+        tuple: (times, temperatures) lists, or None if stopped. The heater is back in closed
+            loop control in any case.
+    """
+    waiter = CancellableWait(should_stop)
+    output = tctrl.get_heater_output(SAMPLE_HEATER)
+    mode = tctrl.get_heater_output_mode(SAMPLE_HEATER)
+
+    # Open loop from the output the PID settled on, so the step is the only disturbance
+    tctrl.set_manual_output(SAMPLE_HEATER, output)
+    tctrl.set_heater_output_mode(SAMPLE_HEATER, tctrl.HeaterOutputMode.OPEN_LOOP, mode["channel"], True)
+    try:
+        times = []
+        temperatures = []
+        start = perf_counter()
+        tctrl.set_manual_output(SAMPLE_HEATER, min(output + step, 100))
+        while perf_counter() - start < duration:
+            times.append(perf_counter() - start)
+            temperatures.append(tctrl.get_all_kelvin_reading()[SAMPLE_INPUT])
+            if not waiter.until(start + len(times) * sample_interval):
+                return None
+        return times, temperatures
+    finally:
+        tctrl.set_manual_output(SAMPLE_HEATER, 0)
+        tctrl.set_heater_output_mode(SAMPLE_HEATER, tctrl.HeaterOutputMode.CLOSED_LOOP, mode["channel"], True)
+
+
+def calibrate_pid_profiles(tctrl, power_amp, bands=PID_BANDS, step=5, duration=900, should_stop=None):
+    """
+    Calibrates a PID profile for each temperature band: the stage is stabilized at the center
+    of the band with the current profile, then the PID settings are fitted from its open loop
+    step response. Each profile is saved as soon as it is fitted.
+
+    Args:
+        tctrl (Model336): The temperature controller.
+        power_amp (float): Maximum heater current (A).
+        bands (list): (low, high, heater range name) of every band to calibrate.
+        step (float): Heater output step (% of the range).
+        duration (float): Recording time of each step response (s).
+        should_stop (function): Returns True to abandon the calibration.
+
+    Returns:
+        PidProfiles: The calibrated profiles, including the ones calibrated before.
+    """
+    waiter = CancellableWait(should_stop)
+    profiles = PidProfiles.load()
+    for low, high, heater_range in bands:
+        temperature = (low + high) / 2
+        log.info(f"Calibrating the PID profile for {low}-{high} K at {temperature} K.")
+
+        configure_heater(tctrl, HeaterSetting.AUTO, power_amp, temperature)
+        tctrl.set_heater_range(SAMPLE_HEATER, tctrl.HeaterRange[heater_range])
+        if not wait_for_temperature(tctrl, temperature, waiter.cancelled) or not waiter.sleep(60):
+            break
+        if magnet_temperature(tctrl) > MAX_MAGNET_TEMPERATURE:
+            log.warning(f"Magnet overheated at {temperature} K, stopping the PID calibration.")
+            break
+
+        response = record_step_response(tctrl, step, duration, waiter.cancelled)
+        if response is None:
+            break
+        try:
+            profile = PidProfile.from_step_response(low, high, heater_range, *response, step)
+        except ValueError as e:
+            log.warning(f"No PID profile for {low}-{high} K: {e}")
+            continue
+
+        log.info(f"Fitted {profile}: gain {profile.gain:.3g} K/%, time constant {profile.time_constant:.0f} s, "
+                 f"dead time {profile.dead_time:.0f} s.")
+        profiles.update(profile)
+        profiles.save()
+
+    return profiles
@@ -0,0 +1,59 @@
+from threading import Event
+from time import perf_counter
+import logging
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Longest time a wait goes without checking `should_stop` (s)
+POLL_INTERVAL = 10e-3
+
+
+class CancellableWait(object):
+    """
+    Waits that end early once cancelled, so a stop takes effect within `poll_interval`
+    instead of at the end of the sleep.
+
+    Cancellation comes from `cancel()`, e.g. called by a Stop button from another thread,
+    or from `should_stop`, e.g. `Procedure.should_stop`, which is checked while waiting.
+    """
+
+    def __init__(self, should_stop=None, poll_interval=POLL_INTERVAL):
+        self.should_stop = should_stop
+        self.poll_interval = poll_interval
+        self.event = Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def reset(self):
+        self.event.clear()
+
+    def cancelled(self):
+        if not self.event.is_set() and self.should_stop is not None and self.should_stop():
+            self.event.set()
+        return self.event.is_set()
+
+    def until(self, deadline):
+        """
+        Waits until the `perf_counter()` time `deadline`.
+
+        Returns:
+            bool: True once the deadline is reached, False if cancelled first.
+        """
+        while not self.cancelled():
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                return True
+            # Only `should_stop` needs polling, `cancel()` ends the wait on the event right away
+            self.event.wait(min(remaining, self.poll_interval) if self.should_stop else remaining)
+        return False
+
+    def sleep(self, seconds):
+        """
+        Waits for `seconds`.
+
+        Returns:
+            bool: True if the whole time elapsed, False if cancelled first.
+        """
+        return self.until(perf_counter() + seconds)
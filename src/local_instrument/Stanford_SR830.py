@@ -24,6 +24,7 @@
 
 import re
 import time
+from bisect import bisect_left
 import numpy as np
 from enum import IntFlag
 from pymeasure.instruments import Instrument
@@ -475,25 +476,99 @@ class SR830(Instrument):
             index = SR830.RESERVE_VALUES.index(reserve)
         self.write("RMOD%d" % index)
 
+    def configure_acquisition(self, reserve, time_constant, filter_slope):
+        """ Set the dynamic reserve, time constant and filter slope in a single write.
+
+        :param reserve: One of :attr:`~.RESERVE_VALUES`
+        :param time_constant: Time constant in seconds, truncated to the next available one
+        :param filter_slope: Filter slope in dB/oct, one of :attr:`~.FILTER_SLOPES`
+        """
+        time_constant = discreteTruncate(time_constant, SR830.TIME_CONSTANTS)
+        self.write("RMOD%d;OFLT%d;OFSL%d" % (
+            SR830.RESERVE_VALUES.index(reserve),
+            SR830.TIME_CONSTANTS.index(time_constant),
+            SR830.FILTER_SLOPES.index(filter_slope),
+        ))
+
     def is_out_of_range(self):
         """ Returns True if the magnitude is out of range
         """
         return int(self.ask("LIAS?2")) == 1
 
-    def quick_range(self):
-        """ While the magnitude is out of range, increase
-        the sensitivity by one setting
+    def is_overloaded(self):
+        """ Returns True if the input, the time constant filter or the output
+        is overloaded. Reading the status clears the latched overload bits.
+        """
+        overloads = LIAStatus.INPUT_OVERLOAD | LIAStatus.FILTER_OVERLOAD | LIAStatus.OUTPUT_OVERLOAD
+        return bool(self.lia_status & overloads)
+
+    @property
+    def input_scale(self):
+        """ Factor that converts a magnitude into the sensitivity setting that
+        covers it, i.e. 1 for voltage inputs and 1e6 for current inputs.
         """
-        self.write('LIAE 2,1')
-        while self.is_out_of_range():
-            self.write("SENS%d" % (int(self.ask("SENS?")) + 1))
-            time.sleep(5.0 * self.time_constant)
-            self.write("*CLS")
-        # Set the range as low as possible
-        newsensitivity = 1.15 * abs(self.magnitude)
         if self.input_config in ('I (1 MOhm)', 'I (100 MOhm)'):
-            newsensitivity = newsensitivity * 1e6
-        self.sensitivity = newsensitivity
+            return 1e6
+        return 1
+
+    def sensitivity_index(self, magnitude, headroom=1.15, input_scale=1):
+        """ Returns the index in SENSITIVITIES of the smallest sensitivity that
+        covers headroom * magnitude.
+        """
+        target = headroom * abs(magnitude) * input_scale
+        return min(bisect_left(self.SENSITIVITIES, target), len(self.SENSITIVITIES) - 1)
+
+    def auto_range(self, headroom=1.15, settle_time=None, waiter=None):
+        """ Sets the sensitivity for the present signal with as few range
+        changes as possible, and returns the new sensitivity.
+
+        If the signal is in range, the sensitivity is computed from the magnitude
+        and set in a single step. If it is overloaded, the sensitivity is raised in
+        growing jumps (3, 6, 12 ... settings) until the overload clears, and then
+        set from the magnitude measured in range.
+
+        :param headroom: Ratio between the sensitivity and the magnitude
+        :param settle_time: Wait after a range change in seconds, defaults
+            to 5 time constants
+        :param waiter: Object whose ``sleep(seconds)`` returns False once the wait
+            is cancelled, e.g. a CancellableWait; if cancelled, the sensitivity
+            reached so far is kept and returned
+        """
+        if settle_time is None:
+            settle_time = 5.0 * self.time_constant
+        input_scale = self.input_scale
+        top = len(self.SENSITIVITIES) - 1
+
+        index = int(self.ask("SENS?"))
+        jump = 3
+        self.clear()
+        while self.is_overloaded() and index < top:
+            index = min(index + jump, top)
+            jump *= 2
+            self.write("SENS%d" % index)
+            if not self._sleep(settle_time, waiter):
+                return self.SENSITIVITIES[index]
+            self.clear()
+
+        target = self.sensitivity_index(self.magnitude, headroom, input_scale)
+        if target != index:
+            self.write("SENS%d" % target)
+        return self.SENSITIVITIES[target]
+
+    def quick_range(self):
+        """ Sets the sensitivity as low as possible for the present
+        signal, see :meth:`~.auto_range`.
+        """
+        self.auto_range(headroom=1.15)
+
+    @staticmethod
+    def _sleep(seconds, waiter=None):
+        """ Sleep with `waiter` if given, returns False if the wait was cancelled.
+        """
+        if waiter is None:
+            time.sleep(seconds)
+            return True
+        return waiter.sleep(seconds)
 
     @property
     def buffer_count(self):
@@ -503,10 +578,13 @@ class SR830(Instrument):
         else:
             return int(query)
 
-    def fill_buffer(self, count: int, has_aborted=lambda: False, delay=0.001):
+    def fill_buffer(self, count: int, has_aborted=lambda: False, delay=0.001, waiter=None):
         """ Fill two numpy arrays with the content of the instrument buffer
 
         Eventually waiting until the specified number of recording is done
+
+        :param waiter: Object whose ``sleep(seconds)`` returns False once the wait
+            is cancelled, e.g. a CancellableWait; defaults to an uncancellable sleep
         """
         ch1 = np.empty(count, np.float32)
         ch2 = np.empty(count, np.float32)
@@ -517,7 +595,9 @@ class SR830(Instrument):
                 ch1[index:currentCount] = self.get_buffer(1, index, currentCount)
                 ch2[index:currentCount] = self.get_buffer(2, index, currentCount)
                 index = currentCount
-                time.sleep(delay)
+                if not self._sleep(delay, waiter):
+                    self.pause_buffer()
+                    return ch1, ch2
             currentCount = self.buffer_count
             if has_aborted():
                 self.pause_buffer()
@@ -527,11 +607,14 @@ class SR830(Instrument):
         ch2[index: count + 1] = self.get_buffer(2, index, count)  # noqa: E203
         return ch1, ch2
 
-    def buffer_measure(self, count, stopRequest=None, delay=1e-3):
+    def buffer_measure(self, count, stopRequest=None, delay=1e-3, waiter=None):
         """ Start a fast measurement mode and transfers data from buffer to extract mean
         and std measurements
 
         Return the mean and std from both channels
+
+        :param waiter: Object whose ``sleep(seconds)`` returns False once the wait
+            is cancelled, e.g. a CancellableWait; defaults to an uncancellable sleep
         """
         self.write("FAST2;STRD")
         ch1 = np.empty(count, np.float64)
@@ -543,7 +626,9 @@ class SR830(Instrument):
                 ch1[index:currentCount] = self.get_buffer(1, index, currentCount)
                 ch2[index:currentCount] = self.get_buffer(2, index, currentCount)
                 index = currentCount
-                time.sleep(delay)
+                if not self._sleep(delay, waiter):
+                    self.pause_buffer()
+                    return (0, 0, 0, 0)
             currentCount = self.buffer_count
             if stopRequest is not None and stopRequest.isSet():
                 self.pause_buffer()
@@ -563,12 +648,16 @@ class SR830(Instrument):
             self.write("FAST0")
 
     def wait_for_buffer(self, count, has_aborted=lambda: False,
-                        timeout=60, timestep=0.01):
+                        timeout=60, timestep=0.01, waiter=None):
         """ Wait for the buffer to fill a certain count
+
+        :param waiter: Object whose ``sleep(seconds)`` returns False once the wait
+            is cancelled, e.g. a CancellableWait; defaults to an uncancellable sleep
         """
         i = 0
         while not self.buffer_count >= count and i < (timeout / timestep):
-            time.sleep(timestep)
+            if not self._sleep(timestep, waiter):
+                return False
             i += 1
             if has_aborted():
                 return False
@@ -588,6 +677,35 @@ class SR830(Instrument):
     def trigger(self):
         self.write("TRIG")
 
+    def arm_trigger(self):
+        """ Prepare the buffer to store one point of CH1 and CH2 on every trigger,
+        sent with :meth:`~.trigger` or as a GPIB group execute trigger. The buffer
+        stores the channel displays, set them with :attr:`~.channel1` and
+        :attr:`~.channel2` beforehand.
+        """
+        self.write("PAUS;REST;SRAT14;SEND0;TSTR0;STRT")
+
+    def read_triggered(self, count=1, timeout=10, poll_interval=0.05, waiter=None):
+        """ Wait until `count` triggered points are stored and return the CH1 and
+        CH2 values of the last one, or None if the wait was cancelled.
+
+        The SR830 has no service request for a stored point, so the buffer count
+        is polled, at an interval that leaves the bus to the other instruments.
+
+        :param count: Number of triggered points to wait for
+        :param timeout: Longest wait in seconds
+        :param poll_interval: Time between buffer count queries in seconds
+        :param waiter: Object whose ``sleep(seconds)`` returns False once the wait
+            is cancelled, e.g. a CancellableWait; defaults to an uncancellable sleep
+        """
+        deadline = time.perf_counter() + timeout
+        while self.buffer_count < count:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("The SR830 did not store the triggered point(s).")
+            if not self._sleep(poll_interval, waiter):
+                return None
+        return self.get_buffer(1, count - 1, count)[0], self.get_buffer(2, count - 1, count)[0]
+
     def snap(self, val1="X", val2="Y", *vals):
         """ Method that records and retrieves 2 to 6 parameters at a single
         instant. The parameters can be one of: X, Y, R, Theta, Aux In 1,
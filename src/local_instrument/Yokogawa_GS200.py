@@ -83,6 +83,17 @@ class YokogawaGS200(SCPIUnknownMixin, Instrument):
         else:
             self.write("SOURce:LEVel %g" % level)
 
+    def write_source_level(self, level):
+        """
+        Set the output level without checking it against the source range first. This saves
+        a range query per call, e.g. when reversing the polarity of a known level at every point.
+        The caller is responsible for keeping the level within 1.2 * source_range.
+
+        :param float level: output level, either a voltage or a current
+        :return: None
+        """
+        self.write("SOURce:LEVel %g" % level)
+
     def trigger_ramp_to_level(self, level, ramp_time):
         """
         Ramp the output level from its current value to "level" in time "ramp_time". This method
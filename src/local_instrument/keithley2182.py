@@ -301,6 +301,32 @@ class Keithley2182(SCPIMixin, KeithleyBuffer, Instrument):
         """Measure the internal temperature in Celsius."""
     )
 
+    ###############
+    # Acquisition #
+    ###############
+
+    continuous_initiation_enabled = Instrument.control(
+        ":INIT:CONT?", ":INIT:CONT %d",
+        """Control whether the trigger model is continuously re-initiated (bool).
+        Must be disabled to take readings with :meth:`~.initiate` and :attr:`~.latest_reading`.""",
+        validator=strict_discrete_set,
+        values={True: 1, False: 0},
+        map_values=True,
+    )
+
+    latest_reading = Instrument.measurement(
+        ":FETC?",
+        """Get the latest reading without triggering a new one. Combined with
+        :meth:`~.initiate`, this allows other bus commands to be sent while the
+        2182 is integrating."""
+    )
+
+    buffer_points_acquired = Instrument.measurement(
+        ":TRAC:POIN:ACT?",
+        """Get the number of readings stored in the buffer.""",
+        cast=int
+    )
+
     ##############
     # Statistics #
     ##############
@@ -378,6 +404,41 @@ class Keithley2182(SCPIMixin, KeithleyBuffer, Instrument):
         """
         return self.write("*TRG")
 
+    def initiate(self):
+        """Initiate one pass through the trigger model without waiting for the reading.
+        The reading can be retrieved with :attr:`~.latest_reading` once complete.
+        """
+        self.write(":INIT")
+
+    def start_statistics_buffer(self, points):
+        """Clear the buffer and store the next readings in it, up to `points` readings.
+        Readings are then taken in blocks with :meth:`~.acquire`, and summarized with
+        :attr:`~.mean` and :attr:`~.standard_dev`.
+
+        :param points: Size of the buffer, from 2 to 1024
+        """
+        self.write(f":TRAC:CLE;:TRAC:POIN {points:d};:TRAC:FEED SENS;:TRAC:FEED:CONT NEXT")
+
+    def acquire(self, count):
+        """Take `count` readings into the buffer, without waiting for them.
+
+        :param count: Number of readings, from 1 to 9,999
+        """
+        self.write(f":TRIG:COUN {count:d};:INIT")
+
+    def configure_acquisition(self, nplc, auto_zero=True, display=True, auto_range=True):
+        """Configure the voltage acquisition speed in a single write.
+
+        :param nplc: Number of power line cycles (NPLC) from 0.01 to 50/60
+        :param auto_zero: Enables auto zero if True
+        :param display: Enables the front display if True
+        :param auto_range: Enables auto range if True, else the present range is kept
+        """
+        self.write(f":SENS:VOLT:NPLC {nplc:g};"
+                   f":SYST:AZER:STAT {int(auto_zero)};"
+                   f":DISP:ENAB {int(display)};"
+                   f":SENS:VOLT:RANG:AUTO {int(auto_range)}")
+
     def trigger_immediately(self):
         """Configure measurements to be taken with the internal trigger at the maximum
         sampling rate.
@@ -0,0 +1,88 @@
+import logging
+from time import sleep, perf_counter
+
+import numpy as np
+
+from pymeasure.instruments import Instrument
+from pymeasure.instruments.keithley.keithley6221 import Keithley6221 as _Keithley6221
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class Keithley6221(_Keithley6221):
+    """ Represents the Keithley 6221 AC and DC current source, extended with the
+    helpers needed to run delta mode together with a Keithley 2182(A) connected
+    over RS-232 and the trigger link.
+
+    .. code-block:: python
+
+        source = Keithley6221("GPIB::17")
+        source.configure_delta(high_current=1e-3, delay=2e-3, count=10)
+        voltage = source.measure_delta()    # Mean delta voltage in Volts
+
+    """
+
+    def __init__(self, adapter, name="Keithley 6221 SourceMeter", **kwargs):
+        super().__init__(adapter, name, **kwargs)
+        self.delta_count = 1
+
+    delta_points_acquired = Instrument.measurement(
+        ":TRAC:POIN:ACT?",
+        """Get the number of delta readings currently stored in the buffer.""",
+        cast=int,
+    )
+
+    def configure_delta(self, high_current, delay=2e-3, count=10, compliance_abort=True):
+        """Configure a delta run of `count` readings alternating between
+        +`high_current` and -`high_current`.
+
+        :param high_current: Delta high source value in Amps, the low value is its negative
+        :param delay: Delay in seconds between a current step and the 2182 trigger
+        :param count: Number of delta readings per run
+        :param compliance_abort: Abort the run if the source goes into compliance
+        """
+        if not self.delta_connected:
+            raise ConnectionError("No Keithley 2182 detected on the 6221 RS-232 port.")
+
+        self.delta_unit = "V"
+        self.delta_high_source = high_current
+        self.delta_delay = delay
+        self.delta_cycles = count
+        self.delta_measurement_sets = 1
+        self.delta_compliance_abort_enabled = compliance_abort
+        self.delta_buffer_points = count
+        self.write(":FORM:ELEM READ")
+        self.delta_count = count
+
+    def measure_delta(self, expected=0, timeout=60, poll_interval=50e-3, should_stop=None):
+        """Arm and run one delta run configured by :meth:`~.configure_delta`,
+        and return the mean of its delta readings in Volts.
+
+        :param expected: Time the run takes at least, in seconds, e.g. from the
+            number of readings and the delay and integration time of each; the
+            buffer count is only queried once it has passed
+        :param timeout: Maximum time to wait for the run to complete, in seconds
+        :param poll_interval: Time between buffer count queries, in seconds
+        :param should_stop: Function returning True to abort the run, in which case
+            None is returned
+        """
+        self.write(":TRAC:CLE")
+        self.delta_arm()
+        self.delta_start()
+
+        start = perf_counter()
+        deadline = start + timeout
+        done_at = start + expected
+        while perf_counter() < done_at or self.delta_points_acquired < self.delta_count:
+            if should_stop is not None and should_stop():
+                self.delta_abort()
+                return None
+            if perf_counter() > deadline:
+                self.delta_abort()
+                raise TimeoutError("Delta run did not complete in time.")
+            sleep(min(poll_interval, max(done_at - perf_counter(), 0)) or poll_interval)
+
+        # A single reading comes back as a plain float
+        readings = np.atleast_1d(self.delta_values)
+        return float(np.mean(readings))
@@ -3,7 +3,7 @@ from PySide6.QtCore import Qt
 
 import sys
 
-from enums.experiments import Experiment, experiments
+from enums.experiments import Experiment, load_experiment, print_import_time_report
 
 class MainWindow(QMainWindow):
     chosen_experiment = next(iter(Experiment))  # Default to the first experiment
@@ -47,7 +47,7 @@ class MainWindow(QMainWindow):
 
     def on_next_btn_clicked(self):
         if self.chosen_experiment:
-            experiment_func = experiments.get(self.chosen_experiment)
+            experiment_func = load_experiment(self.chosen_experiment)
             if experiment_func:
                 experiment_func(self)
                 # self.close()  # Close the main window after opening the experiment configuration window
@@ -57,6 +57,11 @@ class MainWindow(QMainWindow):
             print("No experiment selected.")
     
 
+if "--profile-imports" in sys.argv:
+    # Report how long each experiment module takes to import, then exit.
+    print_import_time_report()
+    sys.exit()
+
 app = QApplication(sys.argv)
 window = MainWindow()
 window.show()
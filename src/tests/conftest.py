@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Imports are rooted at src, like in the experiments
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+from unittest.mock import Mock
+
+import pytest
+
+from helpers.magnet import abort_ramp, ramp_down
+
+
+def make_magnet(fields):
+    magnet = Mock()
+    magnet.measured_magnetic_field.side_effect = list(fields)
+    return magnet
+
+
+def test_ramp_down_reports_until_the_field_descends():
+    magnet = make_magnet([0.5, 0.5, 0.5, 0.45])
+    reports = []
+
+    remaining = ramp_down(magnet, 10, 0.5, lambda field, seconds: reports.append(field), poll_interval=1e-3)
+
+    magnet.set_magnetic_field.assert_called_once_with(0)
+    assert magnet.measured_magnetic_field.call_count == 4
+    assert reports == [0.5, 0.5, 0.5, 0.45]
+    assert remaining == pytest.approx(0.45 * 10 / 0.5)
+
+
+def test_ramp_down_times_out_on_a_stuck_field():
+    magnet = Mock()
+    magnet.measured_magnetic_field.return_value = 0.5
+
+    with pytest.raises(TimeoutError):
+        ramp_down(magnet, 10, 0.5, poll_interval=1e-3, timeout=0.01)
+
+
+def test_abort_ramp_confirms_the_descent_after_a_stop_request():
+    # The procedure's should_stop is already True here, it is not passed on so the check still runs
+    magnet = make_magnet([0.5, 0.5, 0.4])
+
+    abort_ramp(magnet, 10, 0.5)
+
+    assert magnet.measured_magnetic_field.call_count == 3
+
+
+def test_abort_ramp_logs_a_stuck_field(caplog):
+    magnet = Mock()
+    magnet.measured_magnetic_field.return_value = 0.5
+
+    abort_ramp(magnet, 10, 0.5, timeout=0.01)
+
+    magnet.set_magnetic_field.assert_called_once_with(0)
+    assert "not descending" in caplog.text
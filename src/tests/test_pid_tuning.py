@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from helpers.pid_tuning import PidProfile, PidProfiles
+
+VALID = {"low": 3, "high": 10, "heater_range": "LOW", "p": 50, "i": 20, "d": 0}
+
+
+def load(tmp_path, entries):
+    path = tmp_path / "pid_profiles.json"
+    path.write_text(json.dumps(entries))
+    return PidProfiles.load(str(path)).profiles
+
+
+def test_load_keeps_valid_profiles(tmp_path):
+    profiles = load(tmp_path, [VALID])
+
+    assert len(profiles) == 1
+    assert profiles[0].pid == (50, 20, 0)
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        {"low": 3, "p": 50},
+        "LOW",
+        dict(VALID, low="cold"),
+        dict(VALID, heater_range="MAXIMUM"),
+        dict(VALID, heater_range=None),
+        dict(VALID, p=-1),
+        dict(VALID, i=float("inf")),
+        dict(VALID, d="none"),
+    ],
+)
+def test_load_skips_malformed_profiles(tmp_path, entry):
+    profiles = load(tmp_path, [entry, dict(VALID, low=10, high=30)])
+
+    assert [profile.low for profile in profiles] == [10]
+
+
+def test_load_without_a_file(tmp_path):
+    assert PidProfiles.load(str(tmp_path / "missing.json")).profiles == []
+
+
+def test_validate_rejects_unknown_heater_range():
+    with pytest.raises(ValueError):
+        PidProfile(3, 10, "OFF", 50, 20, 0).validate()